@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import platform
+import subprocess
+import numpy as np
+import pandas as pd
+from mano.metrics import metrics
+from mano.data.manager import DataManager
+from mano.data.pages import FilePageStore
+from mano.core.transformers import CategoryCounter, CategoryAverager, CategoryStatistics, ColumnsTypeConverter, \
+    ColumnsRenamer
+
+
+# Stages of the benchmark, and the unit of their rates
+STAGES = [
+    ('parse', 'hits'), ('normalize', 'hits'), ('reduce', 'rows'), ('categoricals', 'rows'), ('process', 'files'),
+    ('concat', 'rows'), ('transformers_fit', 'rows'), ('transformers_transform', 'rows')
+]
+
+WORDS = ['Jardin', 'Maison', 'Outillage', 'Cuisine', 'Salle de bain', 'Chauffage', 'Luminaire', 'Animalerie']
+
+
+def make_hit(rng, object_id, n_sellers=50, n_brands=200):
+    """ Synthetic hit with the fields extracted by the DataManager """
+    categories = lambda level: [' {} {} '.format(rng.choice(WORDS), level) for _ in range(rng.randint(1, 3))]
+    hit = {
+        'objectID': str(object_id), 'model_id': rng.randint(1, 10 ** 6), 'article_id': rng.randint(1, 10 ** 7),
+        'title': ' {} {} {} '.format(rng.choice(WORDS), rng.choice(WORDS), rng.randint(1, 10 ** 4)),
+        'price': round(rng.random() * 500, 2), 'vat_rate': 20.0, 'ecopart': rng.choice([0, 0.5, 1.2]),
+        'discount': rng.choice([0, 0, 10, 20]), 'ranking_score_v1': rng.random(),
+        'seller_name': 'seller {}'.format(rng.randint(1, n_sellers)), 'seller_country_id': rng.choice([1, 2, 3]),
+        'brand_name': rng.choice(['brand {}'.format(rng.randint(1, n_brands)), None]),
+        'rating': rng.choice([None, round(rng.random() * 5, 1)]), 'rating_count': rng.randint(0, 500),
+        'unit_type': rng.choice(['piece', 'm2', 'kg']), 'unit_price': rng.random() * 100, 'min_quantity': 1,
+        'models_count': rng.randint(1, 20),
+        'categories': {'l0': categories(0), 'l1': categories(1), 'l2': categories(2), 'last': categories(3)},
+        'thumbnails': ['thumbnail'] * rng.randint(0, 6), 'brand_image_path': rng.choice(['', 'brand.png']),
+        'has_free_delivery': rng.random() < 0.3, 'has_relay_delivery': rng.random() < 0.5,
+        'has_1day_delivery': rng.random() < 0.1, 'on_sale': rng.random() < 0.2, 'indexable': True,
+        'delivery_offers': {'min_fee': {'as_float': rng.choice([0.0, 4.9, 9.9])}},
+        'prices': {'per_item': {'unit': 'u'}}, 'url': 'https://example.com/p', 'score': 1
+    }
+    if rng.random() < 0.7:
+        hit['catalog_attribute_facet'] = {'color': 'red', 'size': 'L'}
+    if rng.random() < 0.5:
+        hit['banner'] = {'categories': ['topSales-1', 'topSales-2', 'other'][:rng.randint(0, 3)]}
+    return hit
+
+
+def generate_pages(path, n_files, n_hits, duplicate_ratio=0.1, seed=0):
+    """ Write n_files pages of n_hits synthetic hits, like the scraped listing pages. About duplicate_ratio of the
+    hits are objects listed on another page """
+    os.makedirs(path, exist_ok=True)
+    store = FilePageStore(path)
+    rng = random.Random(seed)
+    n_objects = n_files * n_hits
+    for i in range(n_files):
+        hits = []
+        for j in range(n_hits):
+            object_id = rng.randrange(n_objects) if rng.random() < duplicate_ratio else i * n_hits + j
+            hits.append(make_hit(rng, object_id))
+        raw = {'rawResults': [{'hits': hits, 'nbHits': n_hits, 'page': i % 10}], 'state': {'query': ''}}
+        script = 'window.__STATE__ = ' + json.dumps(raw, ensure_ascii=False, separators=(',', ':')) + ';'
+        store.write('category-{}-page-{}.json'.format(i // 10, i % 10 + 1), [script])
+    return store
+
+
+def run(path, seed=0):
+    """ Run each stage once on the pages of path, and return the number of items of each stage """
+    manager = DataManager(path)
+    files = sorted(manager.pages.keys())
+    sizes = {'process': len(files)}
+
+    with metrics.timer('benchmark.parse'):
+        hits = [hit for file in files for hit in manager.pages.iter_hits(file)]
+    sizes['parse'] = sizes['normalize'] = len(hits)
+
+    builder = manager.get_builder()
+    with metrics.timer('benchmark.normalize'):
+        builder.append([builder.extract(hit) for hit in hits])
+        data = builder.to_frame()
+    del hits
+
+    with metrics.timer('benchmark.reduce'):
+        manager._reduce_memory_size(data.copy())
+    with metrics.timer('benchmark.categoricals'):
+        data.copy().utils.to_categoricals()
+    sizes['reduce'] = sizes['categoricals'] = len(data)
+    del data
+
+    with metrics.timer('benchmark.process'):
+        manager._update_manifest()
+        files_chunks = manager.manifest.get_chunks()
+        manager._process_files_chunks(files_chunks)
+    with metrics.timer('benchmark.concat'):
+        data = manager._concat_chunks(sorted(files_chunks))
+    sizes['concat'] = len(data)
+
+    # The loaded dataset is split in train and test halves for the transformers
+    data = data[['seller_name', 'brand_name', 'categories.l2', 'price', 'rating_count', 'discount']].copy()
+    test = data.sample(frac=0.5, random_state=seed)
+    train = data.drop(test.index)
+    transformers = [
+        CategoryCounter('seller_name'), CategoryAverager('brand_name', 'price', cv=5, smoothing=10),
+        CategoryStatistics(['seller_name', 'categories.l2'], ['price', 'rating_count']),
+        ColumnsTypeConverter('float64', 'float32'), ColumnsRenamer()
+    ]
+    with metrics.timer('benchmark.transformers_fit'):
+        for transformer in transformers:
+            # The transformers do not use y
+            train = transformer.fit_transform(train, train['price'])
+    with metrics.timer('benchmark.transformers_transform'):
+        for transformer in transformers:
+            test = transformer.transform(test)
+    sizes['transformers_fit'], sizes['transformers_transform'] = len(train), len(test)
+    return sizes
+
+
+def benchmark(n_files=200, n_hits=50, repeat=3, seed=0, path=None, memory=False):
+    """ Generate the pages, and run the stages repeat times. Each stage is reported with its fastest run, like
+    timeit, with the metrics of the pipeline recorded during that run. The peak memory of the stages is measured
+    with memory, which slows down the stages """
+    directory = tempfile.mkdtemp() if path is None else path
+    was_enabled, was_tracing = metrics.enabled, metrics.trace_memory
+    try:
+        generate_pages(directory, n_files, n_hits, seed=seed)
+        metrics.enable(memory)
+        results, details = {}, None
+        for _ in range(repeat):
+            # Each run starts from the raw pages
+            for name in ['processed', 'manifest.json', 'cache.pkl']:
+                file = os.path.join(directory, name)
+                if os.path.isdir(file):
+                    shutil.rmtree(file)
+                elif os.path.exists(file):
+                    os.remove(file)
+            metrics.reset()
+            sizes = run(directory, seed)
+            report = metrics.get_report()
+            for stage, unit in STAGES:
+                seconds = report.loc['benchmark.' + stage, 'seconds']
+                if stage not in results or seconds < results[stage]['seconds']:
+                    results[stage] = {'seconds': seconds, 'items': sizes[stage], 'unit': unit,
+                                      'per_second': sizes[stage] / seconds}
+                    if memory:
+                        results[stage]['peak_memory_mb'] = report.loc['benchmark.' + stage, 'peak_memory_mb']
+            if details is None or report['seconds'].sum() < details['seconds'].sum():
+                details = report
+    finally:
+        if was_enabled:
+            metrics.enable(was_tracing)
+        else:
+            metrics.disable()
+        if path is None:
+            shutil.rmtree(directory)
+
+    return {
+        'commit': get_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': {'n_files': n_files, 'n_hits': n_hits, 'repeat': repeat, 'seed': seed, 'memory': memory},
+        'platform': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                     'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'stages': results,
+        'metrics': {name: row.dropna().to_dict()
+                    for name, row in details.drop(index=['benchmark.' + stage for stage, _ in STAGES]).iterrows()}
+    }
+
+
+def get_commit():
+    """ Commit of the benchmarked code, None outside of a git repository """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print('commit {}, {} files x {} hits, best of {}'.format(
+        results['commit'], results['params']['n_files'], results['params']['n_hits'], results['params']['repeat']))
+    for stage, stats in results['stages'].items():
+        line = '{:>24} | {:8.3f} s | {:>12,.0f} {}/s'.format(
+            stage, stats['seconds'], stats['per_second'], stats['unit'])
+        if 'peak_memory_mb' in stats:
+            line += ' | {:8.1f} MB'.format(stats['peak_memory_mb'])
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic pages')
+    parser.add_argument('--files', type=int, default=200, help='number of pages')
+    parser.add_argument('--hits', type=int, default=50, help='number of hits per page')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the fastest being reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='json lines file the results are appended to, to compare commits')
+    parser.add_argument('--memory', action='store_true', help='measure the peak memory of the stages, slowing them')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = benchmark(args.files, args.hits, args.repeat, args.seed, memory=args.memory)
+    print_results(results)
+    if args.output is not None:
+        with open(args.output, 'a') as file:
+            file.write(json.dumps(results) + '\n')
@@ -0,0 +1,142 @@
+import random
+import timeit
+import argparse
+import numpy as np
+import pandas as pd
+from benchmarks.pipeline import make_hit
+from mano.data.manager import DataManager
+
+# Features compared between the implementations
+FEATURES = [
+    'title', 'has_brand_image', 'n_thumbnails', 'n_attributes', 'n_topsales', 'n_categories.l0', 'n_categories.l1',
+    'n_categories.l2', 'categories.l0', 'categories.l1', 'categories.l2', 'categories.last'
+]
+
+
+def generate_files(n_files, n_hits, seed=0):
+    """ Hits of n_files pages of n_hits synthetic hits """
+    rng = random.Random(seed)
+    return [[make_hit(rng, i * n_hits + j) for j in range(n_hits)] for i in range(n_files)]
+
+
+def normalize(hits):
+    """ Flat dataframe of the hits, with the attributes mapped to lists, like the former _preprocess_json """
+    hits = [dict(hit, catalog_attribute_facet=[{'label': k, 'value': v}
+                                               for k, v in hit['catalog_attribute_facet'].items()])
+            if 'catalog_attribute_facet' in hit else hit for hit in hits]
+    return pd.json_normalize(hits)
+
+
+def get_length(x):
+    try:
+        return len(x)
+    except Exception:
+        return 0
+
+
+def get_unique_length(x):
+    try:
+        return len(set(x))
+    except Exception:
+        return 0
+
+
+def get_topsales_length(x):
+    try:
+        return len([ts for ts in x if 'topSales' in ts])
+    except Exception:
+        return 0
+
+
+def reduce_per_file(files):
+    """ Features computed per file with a Series.apply per row, before the vectorization """
+    results = []
+    for hits in files:
+        data = normalize(hits)
+        data['title'] = data['title'].apply(lambda s: s.strip())
+        data['has_brand_image'] = data['brand_image_path'].apply(lambda x: ~pd.isnull(x) and len(x) > 0)
+        data['n_thumbnails'] = data['thumbnails'].apply(get_length)
+        data['n_attributes'] = data['catalog_attribute_facet'].apply(get_length) \
+            if 'catalog_attribute_facet' in data.columns else 0
+        data['n_topsales'] = data['banner.categories'].apply(get_topsales_length) \
+            if 'banner.categories' in data.columns else 0
+        for level in ['l0', 'l1', 'l2']:
+            data['n_categories.' + level] = data['categories.' + level].apply(get_unique_length)
+        for level in ['l0', 'l1', 'l2', 'last']:
+            data['categories.' + level] = data['categories.' + level].apply(lambda a: a[0].strip())
+        results.append(data[FEATURES])
+    return pd.concat(results, ignore_index=True)
+
+
+def get_lengths(series):
+    if not pd.api.types.is_object_dtype(series):
+        return pd.Series(0, index=series.index)
+    return series.str.len().fillna(0).astype(np.int64)
+
+
+def get_unique_lengths(series):
+    counts = series.explode().groupby(level=0, sort=False).nunique()
+    return counts.reindex(series.index, fill_value=0).astype(np.int64)
+
+
+def count_items_containing(series, pattern):
+    exploded = series.explode()
+    if not pd.api.types.is_object_dtype(exploded):
+        return pd.Series(0, index=series.index)
+    contains = exploded.str.contains(pattern, regex=False).fillna(False).astype(np.int64)
+    counts = contains.groupby(level=0, sort=False).sum()
+    return counts.reindex(series.index, fill_value=0).astype(np.int64)
+
+
+def reduce_per_chunk(files):
+    """ Features computed once on the concatenated chunk with vectorized operations """
+    data = pd.concat([normalize(hits) for hits in files], sort=False, ignore_index=True)
+    data['title'] = data['title'].str.strip()
+    data['has_brand_image'] = data['brand_image_path'].str.len() > 0
+    data['n_thumbnails'] = get_lengths(data['thumbnails'])
+    data['n_attributes'] = get_lengths(data['catalog_attribute_facet']) \
+        if 'catalog_attribute_facet' in data.columns else 0
+    data['n_topsales'] = count_items_containing(data['banner.categories'], 'topSales') \
+        if 'banner.categories' in data.columns else 0
+    for level in ['l0', 'l1', 'l2']:
+        data['n_categories.' + level] = get_unique_lengths(data['categories.' + level])
+    for level in ['l0', 'l1', 'l2', 'last']:
+        data['categories.' + level] = data['categories.' + level].str[0].str.strip()
+    return data[FEATURES]
+
+
+def reduce_with_builder(files):
+    """ Features computed while extracting the hits, by the builder of the DataManager """
+    builder = DataManager.get_builder()
+    for hits in files:
+        builder.append([builder.extract(hit) for hit in hits])
+    return builder.to_frame()[FEATURES]
+
+
+IMPLEMENTATIONS = {'per_file': reduce_per_file, 'per_chunk': reduce_per_chunk, 'builder': reduce_with_builder}
+
+
+def benchmark(n_files=1000, n_hits=30, repeat=3, seed=0):
+    """ Seconds per 1000 files of each implementation, best of repeat """
+    files = generate_files(n_files, n_hits, seed)
+    reference = None
+    for function in IMPLEMENTATIONS.values():
+        results = function(files).astype({'n_attributes': np.int64, 'n_topsales': np.int64})
+        if reference is None:
+            reference = results
+        pd.testing.assert_frame_equal(results, reference, check_dtype=False)
+    return {name: min(timeit.repeat(lambda: function(files), number=1, repeat=repeat)) * 1000 / n_files
+            for name, function in IMPLEMENTATIONS.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the computation of the features of the hits')
+    parser.add_argument('--files', type=int, default=1000, help='number of pages')
+    parser.add_argument('--hits', type=int, default=30, help='number of hits per page')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the fastest being reported')
+    args = parser.parse_args()
+
+    results = benchmark(args.files, args.hits, args.repeat)
+    print('{} files x {} hits, best of {}'.format(args.files, args.hits, args.repeat))
+    for name, seconds in results.items():
+        print('{:>10} | {:8.3f} s per 1000 files'.format(name, seconds))
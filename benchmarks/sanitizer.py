@@ -0,0 +1,51 @@
+import random
+import timeit
+import argparse
+from mano.data.utils import DIRTY_JSON_REPLACEMENTS, dirty_json_sanitizer
+
+
+def replace_cascade(s):
+    """ Former sanitizing of the dirty json, with one str.replace per pattern of the table, in order """
+    for pattern, replacement in DIRTY_JSON_REPLACEMENTS:
+        s = s.replace(pattern, replacement)
+    return s
+
+
+def generate_payload(size, pattern_probability=0.2, seed=0):
+    """ Json like text of about size characters, made of pieces of text and of patterns of the table, each piece
+    being a pattern with pattern_probability """
+    rng = random.Random(seed)
+    patterns = [pattern for pattern, _ in DIRTY_JSON_REPLACEMENTS]
+    text = '{"objectID":"12345","title":"Perceuse visseuse sans fil 18V","price":89.9,"brand_name":"Marque"},'
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(patterns) if rng.random() < pattern_probability else text[:rng.randint(1, len(text))]
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def benchmark(size, repeat=5, block_size=2 ** 16):
+    payload = generate_payload(size)
+    blocks = [payload[i:i + block_size] for i in range(0, len(payload), block_size)]
+    assert ''.join(dirty_json_sanitizer.sanitize_blocks(blocks)) == dirty_json_sanitizer.sanitize(payload)
+
+    functions = {
+        'replace_cascade': lambda: replace_cascade(payload),
+        'sanitize': lambda: dirty_json_sanitizer.sanitize(payload),
+        'sanitize_blocks': lambda: ''.join(dirty_json_sanitizer.sanitize_blocks(blocks))
+    }
+    return {name: min(timeit.repeat(function, number=1, repeat=repeat)) for name, function in functions.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the dirty json sanitizing on a synthetic payload')
+    parser.add_argument('--size', type=int, default=10 ** 7, help='number of characters of the payload')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs, the fastest being reported')
+    args = parser.parse_args()
+
+    results = benchmark(args.size, args.repeat)
+    print('{:,} characters, best of {}'.format(args.size, args.repeat))
+    for name, seconds in results.items():
+        print('{:>16} | {:8.3f} s | {:8.1f} MB/s'.format(name, seconds, args.size / seconds / 2 ** 20))
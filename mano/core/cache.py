@@ -0,0 +1,182 @@
+import os
+import pickle
+import hashlib
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.base import TransformerMixin, BaseEstimator
+
+
+# Changed to invalidate the cached artifacts when the transformers change
+CACHE_VERSION = 1
+
+
+class ArtifactCache:
+    """ Content-addressed cache of pickled artifacts in a directory. The least recently used artifacts are deleted
+    once the cache holds more than max_bytes """
+
+    def __init__(self, path, max_bytes=2 * 1024 ** 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def get(self, key):
+        """ Return the artifact of the key, None if it is not cached """
+        file = self._get_file(key)
+        try:
+            with open(file, 'rb') as f:
+                artifact = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # The modification time records the last use
+        os.utime(file)
+        return artifact
+
+    def set(self, key, artifact):
+        # The artifact is written to a temporary file first, so that a partial artifact is never read
+        descriptor, temp_file = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as f:
+            pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, self._get_file(key))
+        self._evict()
+
+    def _get_file(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def _evict(self):
+        files = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum([file_size for _, file_size, _ in files])
+        for _, file_size, file in sorted(files):
+            if size <= self.max_bytes:
+                break
+            logging.info('Evicting {} from the cache'.format(os.path.basename(file)))
+            os.remove(file)
+            size -= file_size
+
+
+class CachedTransformer(TransformerMixin, BaseEstimator):
+    """ Memoize the fit and transform of a transformer in an ArtifactCache (or a cache directory). Fitted states are
+    keyed by the transformer params, a fingerprint of y and of the columns it reads, given by its get_input_columns
+    method (all the columns by default). The computed columns, given by its get_output_columns method, are keyed by
+    the fitted state and the fingerprint of the transformed columns. Transformers without get_output_columns, or with
+    a copy param like the columns converters, whose outputs are cheaper to compute than to load, are always
+    applied """
+
+    def __init__(self, transformer, cache):
+        self.transformer = transformer
+        self.cache = cache
+
+    def fit(self, X, y=None):
+        return self._fit(X, y, self._get_fit_key(self._get_fingerprint(X), y))
+
+    def transform(self, X):
+        return self._transform(X, self._get_fingerprint(X))
+
+    def fit_transform(self, X, y=None):
+        # X is fingerprinted once, and the fit_transform of the transformer is cached apart, as it may differ from a
+        # fit then a transform, like the out-of-fold averages of CategoryAverager
+        fit_key = self._get_fit_key(self._get_fingerprint(X), y)
+        if not self._is_output_cached():
+            return self._fit(X, y, fit_key).transformer.transform(X)
+
+        cache = get_cache(self.cache)
+        self.fit_key = fit_key
+        key = get_key(self.fit_key, 'fit_transform')
+        state, outputs = cache.get(self.fit_key), cache.get(key)
+        if state is None or outputs is None:
+            results = self.transformer.fit_transform(X, y)
+            cache.set(self.fit_key, self._get_state())
+            cache.set(key, {column: results[column].array for column in self.transformer.get_output_columns(X)})
+            return results
+
+        vars(self.transformer).update(state)
+        return self._apply(X, outputs)
+
+    def _fit(self, X, y, fit_key):
+        cache = get_cache(self.cache)
+        self.fit_key = fit_key
+        state = cache.get(self.fit_key)
+        if state is None:
+            self.transformer.fit(X, y)
+            cache.set(self.fit_key, self._get_state())
+        else:
+            vars(self.transformer).update(state)
+        return self
+
+    def _transform(self, X, fingerprint):
+        if not self._is_output_cached():
+            return self.transformer.transform(X)
+
+        cache = get_cache(self.cache)
+        key = get_key(self.fit_key, fingerprint)
+        outputs = cache.get(key)
+        if outputs is None:
+            output_columns = self.transformer.get_output_columns(X)
+            results = self.transformer.transform(X)
+            cache.set(key, {column: results[column].array for column in output_columns})
+            return results
+        return self._apply(X, outputs)
+
+    def _apply(self, X, outputs):
+        # The transformers whose outputs are cached add their columns to X
+        for column, values in outputs.items():
+            X[column] = values
+        return X
+
+    def _is_output_cached(self):
+        return hasattr(self.transformer, 'get_output_columns') and 'copy' not in self.transformer.get_params()
+
+    def _get_fit_key(self, fingerprint, y):
+        y_fingerprint = None if y is None else get_frame_fingerprint(pd.DataFrame({'y': np.asarray(y)}), ['y'])
+        return get_key(type(self.transformer).__name__, sorted(self.transformer.get_params().items()), fingerprint,
+                       y_fingerprint)
+
+    def _get_state(self):
+        """ Fitted attributes of the transformer """
+        params = self.transformer.get_params()
+        return {k: v for k, v in vars(self.transformer).items() if k not in params}
+
+    def _get_fingerprint(self, X):
+        if hasattr(self.transformer, 'get_input_columns'):
+            # Columns only read at fit, like the averaged ones, may be missing from the transformed X
+            columns = [c for c in self.transformer.get_input_columns(X) if c in X.columns]
+        else:
+            columns = list(X.columns)
+        return get_frame_fingerprint(X, columns)
+
+
+def get_cache(cache):
+    """ Get the cache of a directory, or return the cache instance given """
+    if isinstance(cache, str):
+        return ArtifactCache(cache)
+    return cache
+
+
+def get_key(*parts):
+    return hashlib.sha1(repr((CACHE_VERSION,) + parts).encode('utf-8')).hexdigest()
+
+
+def get_frame_fingerprint(X, columns):
+    """ Hash of the names of all the columns, and of the dtypes and values of the given columns """
+    fingerprint = hashlib.sha1(repr(list(X.columns)).encode('utf-8'))
+    for column in columns:
+        update_fingerprint(fingerprint, X[column])
+    return fingerprint.hexdigest()
+
+
+def update_fingerprint(fingerprint, series):
+    """ Hash the values of a series: the bytes of numpy values and categorical codes are hashed as is, only the
+    categories and the object values being hashed by pandas """
+    fingerprint.update(str(series.dtype).encode('utf-8'))
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        fingerprint.update(np.ascontiguousarray(series.cat.codes.to_numpy()).data)
+        fingerprint.update(pd.util.hash_pandas_object(series.cat.categories, index=False).to_numpy().data)
+    elif isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+        fingerprint.update(np.ascontiguousarray(series.to_numpy()).data)
+    else:
+        fingerprint.update(pd.util.hash_pandas_object(series, index=False).to_numpy().data)
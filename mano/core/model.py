@@ -1,33 +1,245 @@
+import os
+import pickle
+import hashlib
+import tempfile
+import collections
+import numpy as np
+import pandas as pd
 import lightgbm as lgb
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from sklearn.model_selection import KFold
+from mano.metrics import metrics
+
+
+# Parameters used to build the binned dataset, which must be part of its fingerprint. Their aliases are
+# fingerprinted under these names
+DATASET_PARAMS = [
+    'max_bin', 'max_bin_by_feature', 'min_data_in_bin', 'bin_construct_sample_cnt', 'data_random_seed', 'seed',
+    'is_enable_sparse', 'enable_bundle', 'use_missing', 'zero_as_missing', 'feature_pre_filter', 'min_data_in_leaf',
+    'linear_tree', 'max_cat_to_onehot', 'forcedbins_filename', 'categorical_feature'
+]
+
+EARLY_STOPPING_ROUNDS = 50
+NUM_BOOST_ROUND = 5000
+
+
+class DatasetCache:
+    """ Last binned datasets built, by fingerprint. A cache can be given to several wrappers fitted on the same
+    data, like in a search of the training params """
+
+    def __init__(self, size=2):
+        self.size = size
+        self.datasets = collections.OrderedDict()
+
+    def get(self, fingerprint):
+        if fingerprint not in self.datasets:
+            return None
+        self.datasets.move_to_end(fingerprint)
+        return self.datasets[fingerprint]
+
+    def add(self, fingerprint, dataset):
+        self.datasets[fingerprint] = dataset
+        self.datasets.move_to_end(fingerprint)
+        while len(self.datasets) > self.size:
+            self.datasets.popitem(last=False)
 
 
 class LightGbmWrapper:
     """ LightGBM wrapper to fit a model after computing the best iteration using a cross validation """
 
-    def __init__(self, params, categoricals='auto', cv=5, verbose=1):
+    def __init__(self, params, categoricals='auto', cv=5, verbose=1, cache_path=None, n_jobs=None,
+                 average_folds=False, dataset_cache=None):
         self.params = params
         self.categoricals = categoricals
         self.cv = cv
         self.verbose = verbose
+        self.cache_path = cache_path
+        self.n_jobs = n_jobs
+        self.average_folds = average_folds
+        self.dataset_cache = dataset_cache if dataset_cache is not None else DatasetCache()
         self.best_iteration = None
         self.score = None
         self.model = None
+        self.boosters = None
+        self.columns = None
 
+    def __getstate__(self):
+        # The binned datasets are not saved with the model
+        state = dict(self.__dict__)
+        state['dataset_cache'] = DatasetCache(self.dataset_cache.size)
+        return state
+
+    @metrics.timed()
     def fit(self, X, y):
-        dataset = lgb.Dataset(X, label=y, categorical_feature=self.categoricals, free_raw_data=False)
+        self.columns = list(X.columns)
+        dataset, dataset_path = self._get_dataset(X, y)
+        if self.n_jobs is None:
+            self._cross_validate(dataset)
+        else:
+            self._cross_validate_parallel(dataset, dataset_path)
+
+        self.model = None
+        if not self.average_folds:
+            self.boosters = None
+            self.model = lgb.train(self.params, dataset, num_boost_round=self.best_iteration)
+        return self
+
+    @metrics.timed()
+    def predict(self, X, batch_size=None, n_jobs=None, out=None):
+        """ Predict X at once, or by batches of batch_size rows predicted by n_jobs threads if set, so that only the
+        batches being predicted are converted to the model features. Predictions are written to out if given, like
+        a memmap """
+        if batch_size is None and n_jobs is None and out is None:
+            return self._predict(X)
+
+        if batch_size is None:
+            batch_size = max(int(np.ceil(len(X) / (n_jobs or 1))), 1)
+        starts = range(0, len(X), batch_size)
+        batches = (get_rows(X, start, start + batch_size) for start in starts)
+        for start, predictions in zip(starts, self.predict_iter(batches, n_jobs)):
+            if out is None:
+                out = np.empty((len(X),) + predictions.shape[1:], dtype=predictions.dtype)
+            out[start:start + len(predictions)] = predictions
+        return out if out is not None else np.empty(0)
+
+    def predict_iter(self, batches, n_jobs=None):
+        """ Predict each dataframe of batches, like the chunks of DataManager.iter_chunks, and yield the predictions
+        in order. Batches are predicted by n_jobs threads if set, at most n_jobs at once so that the batches are
+        consumed as they are predicted """
+        if n_jobs is None:
+            for batch in batches:
+                yield self._predict(batch)
+            return
+
+        with ThreadPoolExecutor(n_jobs) as executor:
+            futures = collections.deque()
+            for batch in batches:
+                if len(futures) >= n_jobs:
+                    yield futures.popleft().result()
+                # Each batch is predicted by a single LightGBM thread, the batches being run in parallel
+                futures.append(executor.submit(self._predict, batch, 1))
+            while len(futures) > 0:
+                yield futures.popleft().result()
+
+    def _predict(self, X, num_threads=None):
+        if self.model is None and self.boosters is None:
+            raise ValueError('Model is not fitted')
+
+        # Batches like the DataManager chunks hold more columns than the model features
+        if isinstance(X, pd.DataFrame) and list(X.columns) != self.columns:
+            X = X[self.columns]
+        params = {} if num_threads is None else {'num_threads': num_threads}
+        if self.model is None:
+            return np.mean([booster.predict(X, num_iteration=self.best_iteration, **params)
+                            for booster in self.boosters], axis=0)
+        return self.model.predict(X, **params)
+
+    def _cross_validate(self, dataset):
+        callbacks = [lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=bool(self.verbose))]
+        if self.verbose:
+            callbacks.append(lgb.log_evaluation(self.verbose))
         cv = lgb.cv(self.params, dataset,
-                    num_boost_round=5000,
-                    early_stopping_rounds=50,
+                    num_boost_round=NUM_BOOST_ROUND,
                     nfold=self.cv,
                     stratified=False, #required for regression
-                    verbose_eval=self.verbose)
-        self.best_iteration = len(cv['l2-mean'])
-        self.score = cv['l2-mean'][-1]
-        self.model = lgb.train(self.params, dataset, num_boost_round=self.best_iteration)
-        return self
+                    callbacks=callbacks,
+                    return_cvbooster=self.average_folds)
+        # The scores are truncated at the best iteration
+        scores = cv[[key for key in cv if key.endswith('-mean')][0]]
+        self.best_iteration = len(scores)
+        self.score = scores[-1]
+        if self.average_folds:
+            self.boosters = cv['cvbooster'].boosters
+
+    def _cross_validate_parallel(self, dataset, dataset_path):
+        # The folds processes load the dataset binary, saved for the fit if there is no cache_path
+        with tempfile.TemporaryDirectory() as directory:
+            if dataset_path is None:
+                dataset_path = os.path.join(directory, 'dataset.bin')
+                save_dataset(dataset, dataset_path)
+            folds = KFold(self.cv, shuffle=True, random_state=0).split(np.arange(dataset.num_data()))
+            with ProcessPoolExecutor(self.n_jobs) as executor:
+                futures = [executor.submit(train_fold, self.params, dataset_path, dataset.pandas_categorical,
+                                           np.sort(train_index), np.sort(valid_index))
+                           for train_index, valid_index in folds]
+                results = [future.result() for future in futures]
+
+        # Mean score over the rounds run by all the folds
+        n_rounds = min([len(scores) for scores, _, _ in results])
+        scores = np.mean([scores[:n_rounds] for scores, _, _ in results], axis=0)
+        higher_better = results[0][1]
+        self.best_iteration = int(np.argmax(scores) if higher_better else np.argmin(scores)) + 1
+        self.score = scores[self.best_iteration - 1]
+        if self.average_folds:
+            self.boosters = [lgb.Booster(model_str=model) for _, _, model in results]
+
+    def _get_dataset(self, X, y):
+        """ Return the binned dataset and the path of its binary, if saved. The dataset is loaded from the memory or
+        the cache_path if it has already been built """
+        fingerprint = get_fingerprint(X, y, self.categoricals, self.params)
+        dataset_path = os.path.join(self.cache_path, fingerprint + '.bin') if self.cache_path is not None else None
+
+        dataset = self.dataset_cache.get(fingerprint)
+        if dataset is None and dataset_path is not None and os.path.exists(dataset_path):
+            dataset = load_dataset(dataset_path, self.params)
+        elif dataset is None:
+            dataset = lgb.Dataset(X, label=y, categorical_feature=self.categoricals, params=dict(self.params))
+            dataset.construct()
+
+        if dataset_path is not None and not os.path.exists(dataset_path):
+            save_dataset(dataset, dataset_path)
+        self.dataset_cache.add(fingerprint, dataset)
+        return dataset, dataset_path
+
+
+def get_rows(X, start, stop):
+    """ Rows of a dataframe or of an array by position """
+    return X.iloc[start:stop] if isinstance(X, (pd.DataFrame, pd.Series)) else X[start:stop]
+
+
+def train_fold(params, dataset_path, pandas_categorical, train_index, valid_index):
+    """ Train a fold with early stopping on the dataset binary. Return the validation scores, if higher scores are
+    better, and the model """
+    dataset = load_dataset(dataset_path, params)
+    train, valid = dataset.subset(train_index), dataset.subset(valid_index)
+    evaluations = {}
+    booster = lgb.train(params, train, num_boost_round=NUM_BOOST_ROUND, valid_sets=[valid], valid_names=['valid'],
+                        callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False),
+                                   lgb.record_evaluation(evaluations)])
+    metric = list(evaluations['valid'])[0]
+    higher_better = metric.startswith(('auc', 'ndcg', 'map', 'average_precision'))
+    booster.pandas_categorical = pandas_categorical
+    return evaluations['valid'][metric], higher_better, booster.model_to_string()
+
+
+def get_fingerprint(X, y, categoricals, params):
+    """ Hash of the data, the categoricals and the params used to build the binned dataset """
+    fingerprint = hashlib.sha1()
+    fingerprint.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    fingerprint.update(pd.util.hash_pandas_object(pd.Series(np.asarray(y)), index=False).to_numpy().tobytes())
+    fingerprint.update(repr([list(X.columns), list(X.dtypes.astype(str)), categoricals]).encode('utf-8'))
+    fingerprint.update(repr(get_dataset_params(params)).encode('utf-8'))
+    return fingerprint.hexdigest()
+
+
+def get_dataset_params(params):
+    """ Sorted (name, value) of the params used to build the binned dataset, the aliases being replaced by the names
+    of DATASET_PARAMS """
+    names = {alias: name for name in DATASET_PARAMS for alias in lgb.basic._ConfigAliases.get(name)}
+    return sorted([(names[k], repr(v)) for k, v in params.items() if k in names])
+
+
+def save_dataset(dataset, path):
+    """ Save the dataset binary, with the categories of the pandas categoricals which are not part of it """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    dataset.save_binary(path)
+    with open(path + '.categories', 'wb') as file:
+        pickle.dump(dataset.pandas_categorical, file)
 
-    def predict(self, X):
-        if self.model is None:
-            raise ValueError('Model is not fitted')
 
-        return self.model.predict(X)
\ No newline at end of file
+def load_dataset(path, params):
+    dataset = lgb.Dataset(path, params=dict(params))
+    dataset.construct()
+    with open(path + '.categories', 'rb') as file:
+        dataset.pandas_categorical = pickle.load(file)
+    return dataset
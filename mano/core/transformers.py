@@ -1,72 +1,243 @@
 import unidecode
+import numpy as np
 import pandas as pd
 from sklearn.base import TransformerMixin, BaseEstimator
+from mano.metrics import metrics
 
 
 class ColumnsTypeConverter(TransformerMixin, BaseEstimator):
-    """ Convert all columns from of type "from_type" to type "to_type" """
+    """ Convert all columns from of type "from_type" to type "to_type". If copy is False, X is not copied: the
+    columns not converted are shared with X, which is left unchanged """
 
-    def __init__(self, from_type, to_type):
+    def __init__(self, from_type, to_type, copy=True):
         self.from_type = from_type
         self.to_type = to_type
+        self.copy = copy
 
+    @metrics.timed()
     def fit(self, X, y):
         return self
 
+    @metrics.timed()
     def transform(self, X):
-        X = X.copy()
-        for c in X.columns:
-            if (isinstance(self.from_type, str) and str(X[c].dtype) == self.from_type) or \
-                    (isinstance(self.from_type, type) and X[c].dtype == self.from_type):
-                X[c] = X[c].astype(self.to_type)
+        columns = self.get_output_columns(X)
+        X = X.copy(deep=self.copy)
+        for c in columns:
+            X[c] = X[c].astype(self.to_type)
         return X
 
+    def get_input_columns(self, X):
+        return self.get_output_columns(X)
+
+    def get_output_columns(self, X):
+        """ Columns converted """
+        return [c for c in X.columns if (isinstance(self.from_type, str) and str(X[c].dtype) == self.from_type) or
+                (isinstance(self.from_type, type) and X[c].dtype == self.from_type)]
+
 
 class ColumnsRenamer(TransformerMixin, BaseEstimator):
-    """ Remove special characters and spaces from columns names """
+    """ Remove special characters and spaces from columns names. The new names are computed at fit, or at transform
+    if not fitted. If copy is False, X is not copied: only the columns names are rebuilt, the data being shared with
+    X """
+
+    def __init__(self, copy=True):
+        self.copy = copy
 
+    @metrics.timed()
     def fit(self, X, y):
+        self.mapping = {column: get_clean_column_name(column) for column in X.columns}
         return self
 
+    @metrics.timed()
     def transform(self, X):
-        X = X.copy()
-        X.columns = [unidecode.unidecode(c).replace(' ', '_').strip() for c in X.columns]
-        X.columns = [''.join([c if c.isalnum() else '_' for c in column]) for column in X.columns]
+        mapping = getattr(self, 'mapping', {})
+        X = X.copy(deep=self.copy)
+        X.columns = [mapping[c] if c in mapping else get_clean_column_name(c) for c in X.columns]
         return X
 
+    def get_input_columns(self, X):
+        # Only the columns names are used
+        return []
+
 
 class CategoryCounter(TransformerMixin, BaseEstimator):
-    """ Count the number of observations associated to each modality of a given column """
+    """ Count the number of observations associated to each modality of a given column. The counts are looked up by
+    the codes of the column, and the count column is added to X in place """
 
     def __init__(self, column):
         self.column = column
         self.count_column = column + '_count'
 
+    @metrics.timed()
     def fit(self, X, y):
-        self.count = X.groupby(self.column).size().reset_index()
-        self.count.columns = [self.column, self.count_column]
+        codes, self.categories = factorize_categories(X[self.column])
+        self.counts = get_counts(codes, len(self.categories))
         return self
 
+    @metrics.timed()
     def transform(self, X):
-        X = pd.merge(X, self.count, on=self.column, how='left')
-        X[self.count_column] = X[self.count_column].fillna(0)
+        X[self.count_column] = lookup_categories(self.categories, self.counts, X[self.column])
         return X
 
+    def get_input_columns(self, X):
+        return [self.column]
+
+    def get_output_columns(self, X):
+        return [self.count_column]
+
 
 class CategoryAverager(TransformerMixin, BaseEstimator):
-    """ Compute the average value of average_column for each modality of a given column """
+    """ Compute the average value of average_column for each modality of a given column, out of fold if cv is set """
 
-    def __init__(self, column, average_column):
+    def __init__(self, column, average_column, cv=None, smoothing=0, random_state=0):
         self.column = column
         self.average_column = average_column
+        self.cv = cv
+        self.smoothing = smoothing
+        self.random_state = random_state
         self.ouput_column = column + '_' + average_column + '_average'
 
+    @metrics.timed()
     def fit(self, X, y):
-        self.count = X.groupby(self.column)[self.average_column].mean().reset_index()
-        self.count.columns = [self.column, self.ouput_column]
+        codes, self.categories = factorize_categories(X[self.column])
+        values = X[self.average_column].to_numpy(dtype=np.float64)
+        sums, counts = get_sums_and_counts(codes, values, len(self.categories))
+        self._fit_averages(sums, counts, np.nansum(values), np.count_nonzero(~np.isnan(values)))
         return self
 
+    @metrics.timed()
+    def fit_transform(self, X, y=None):
+        if self.cv is None:
+            return self.fit(X, y).transform(X)
+
+        codes, self.categories = factorize_categories(X[self.column])
+        values = X[self.average_column].to_numpy(dtype=np.float64)
+        n_categories = len(self.categories)
+        folds = get_folds(len(X), self.cv, self.random_state)
+        # Each row is given a code per fold and category, missing categories having the last code of their fold, so
+        # that the sums and counts of all the folds come from a single bincount
+        codes = folds * (n_categories + 1) + np.where(codes >= 0, codes, n_categories)
+        sums, counts = get_sums_and_counts(codes, values, self.cv * (n_categories + 1))
+        sums, counts = sums.reshape(self.cv, n_categories + 1), counts.reshape(self.cv, n_categories + 1)
+        self._fit_averages(sums[:, :-1].sum(axis=0), counts[:, :-1].sum(axis=0), sums.sum(), counts.sum())
+
+        # Averages out of each fold, the global average out of the fold being given to the missing categories if
+        # smoothed, 0 otherwise
+        other_sums, other_counts = sums.sum(axis=0) - sums, counts.sum(axis=0) - counts
+        priors = get_smoothed_averages(other_sums.sum(axis=1), other_counts.sum(axis=1))
+        averages = get_smoothed_averages(other_sums, other_counts, priors[:, None], self.smoothing)
+        averages[:, -1] = priors if self.smoothing > 0 else 0
+        X[self.ouput_column] = averages.ravel()[codes]
+        return X
+
+    @metrics.timed()
     def transform(self, X):
-        X = pd.merge(X, self.count, on=self.column, how='left')
-        X[self.ouput_column] = X[self.ouput_column].fillna(0)
-        return X
\ No newline at end of file
+        X[self.ouput_column] = lookup_categories(self.categories, self.averages, X[self.column], self.default)
+        return X
+
+    def get_input_columns(self, X):
+        return [self.column, self.average_column]
+
+    def get_output_columns(self, X):
+        return [self.ouput_column]
+
+    def _fit_averages(self, sums, counts, total_sum, total_count):
+        self.prior = get_smoothed_averages(total_sum, total_count)
+        self.averages = get_smoothed_averages(sums, counts, self.prior, self.smoothing)
+        # Unknown and missing categories get the global average if smoothed, 0 otherwise
+        self.default = self.prior if self.smoothing > 0 else 0
+
+
+class CategoryStatistics(TransformerMixin, BaseEstimator):
+    """ For each of the given columns, count the number of observations associated to each modality, and compute
+    the average value of each of the average_columns, with a single grouping of the column. The columns are named
+    like the CategoryCounter and CategoryAverager ones, and are added to X in place """
+
+    def __init__(self, columns, average_columns=None, count=True):
+        self.columns = columns
+        self.average_columns = average_columns
+        self.count = count
+
+    @metrics.timed()
+    def fit(self, X, y):
+        self.statistics = {}
+        for column in self.columns:
+            codes, categories = factorize_categories(X[column])
+            statistics = {}
+            if self.count:
+                statistics[column + '_count'] = get_counts(codes, len(categories))
+            for average_column in self.average_columns or []:
+                statistics[column + '_' + average_column + '_average'] = \
+                    get_averages(codes, X[average_column], len(categories))
+            self.statistics[column] = (categories, statistics)
+        return self
+
+    @metrics.timed()
+    def transform(self, X):
+        for column, (categories, statistics) in self.statistics.items():
+            indexer = get_categories_indexer(categories, X[column])
+            for output_column, values in statistics.items():
+                X[output_column] = np.append(values, 0)[indexer]
+        return X
+
+    def get_input_columns(self, X):
+        return list(self.columns) + [c for c in self.average_columns or [] if c not in self.columns]
+
+    def get_output_columns(self, X):
+        return [output_column for _, statistics in self.statistics.values() for output_column in statistics]
+
+
+def get_clean_column_name(column):
+    column = unidecode.unidecode(column).replace(' ', '_').strip()
+    return ''.join([c if c.isalnum() else '_' for c in column])
+
+
+def factorize_categories(values):
+    """ Codes of the values (-1 for missing values) and their categories, the codes of categoricals being used as is """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    codes, categories = pd.factorize(values)
+    return codes, pd.Index(categories, tupleize_cols=False)
+
+
+def get_categories_indexer(categories, values):
+    """ Position of the values in the fitted categories, -1 for unknown and missing values. Only the categories of
+    categoricals are looked up """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return np.append(categories.get_indexer(values.cat.categories), -1)[values.cat.codes.to_numpy()]
+    return categories.get_indexer(values)
+
+
+def lookup_categories(categories, statistics, values, default=0):
+    """ Statistics of the categories of the values, default for unknown and missing values """
+    return np.append(statistics, default)[get_categories_indexer(categories, values)]
+
+
+def get_counts(codes, n_categories):
+    return np.bincount(codes[codes >= 0], minlength=n_categories)
+
+
+def get_averages(codes, values, n_categories):
+    """ Average of the values of each category, 0 for categories without values """
+    return get_smoothed_averages(*get_sums_and_counts(codes, values, n_categories))
+
+
+def get_sums_and_counts(codes, values, n_categories):
+    """ Sum and count of the values of each category, missing values being ignored """
+    values = np.asarray(values, dtype=np.float64)
+    mask = (codes >= 0) & ~np.isnan(values)
+    sums = np.bincount(codes[mask], weights=values[mask], minlength=n_categories)
+    counts = np.bincount(codes[mask], minlength=n_categories)
+    return sums, counts
+
+
+def get_smoothed_averages(sums, counts, prior=0, smoothing=0):
+    """ Averages pulled towards the prior, weighted like smoothing values. 0 for categories without values if not
+    smoothed """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nan_to_num((sums + smoothing * prior) / (counts + smoothing))
+
+
+def get_folds(n_rows, cv, random_state=0):
+    """ Random fold of each row. Folds are drawn independently, so their sizes are only even on average """
+    return np.random.RandomState(random_state).randint(cv, size=n_rows)
@@ -0,0 +1,11 @@
+import os
+from mano.config import config
+from mano.data.scraper import Scraper
+from mano.data.manager import DataManager
+from mano.data.pipeline import crawl_and_load
+
+
+if __name__ == '__main__':
+    scraper = Scraper(config.SITE_URL, save_path=config.DATA_PATH, n_threads=8)
+    manager = DataManager(config.DATA_PATH, n_workers=os.cpu_count(), pages=scraper.pages)
+    data = crawl_and_load(scraper, manager)
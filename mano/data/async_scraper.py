@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import collections
+import aiohttp
+from lxml import html
+from mano.metrics import metrics
+from mano.data.scraper import Scraper
+from mano.data.utils import get_html_values
+from mano.data.throttle import RetryableResponse, RETRY_STATUS_CODES, parse_retry_after
+
+
+class AsyncScraper(Scraper):
+    """ Scraper running on an event loop, with a single pooled http client (keep-alive connections) shared by all
+    requests. All the scraping methods are coroutines: categories and sub categories are scraped concurrently, and
+    at most `concurrency` requests are in flight, the next waiting request starting as soon as one is done. The pages
+    of a sub category are fetched at most `page_window` at a time, as its last page is only known once fetched: the
+    pages fetched beyond it are wasted requests. The output files and the recovery files are the same as the
+    Scraper's ones """
+
+    def __init__(self, url, save_path=None, max_pages=None, concurrency=8, rate_limiter=None, state=None,
+                 pages='files', extract_hits=False, pages_queue=None, page_window=1):
+        Scraper.__init__(self, url, save_path, max_pages, rate_limiter=rate_limiter, state=state, pages=pages,
+                         extract_hits=extract_hits, pages_queue=pages_queue)
+        self.concurrency = concurrency
+        self.page_window = page_window
+        self.client = None
+        self.semaphore = None
+        self.scheduled = set()
+
+    def run(self):
+        asyncio.run(self._run())
+
+    async def _run(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as client:
+            self.client = client
+            r, page_html = await self.get_page(self.url)
+            group_categories = get_html_values(page_html, '//div/ul/li/ul/li/a/@href')
+            await asyncio.gather(*[self._scrap_group_category(group_category) for group_category in group_categories
+                                   if not self._is_scraping_finished('group_categories', group_category)])
+        self.state.flush()
+        logging.info('Crawl stats: {}'.format(self.rate_limiter.get_stats()))
+
+    async def get_page(self, url):
+        tries = 0
+        while tries < self.max_tries:
+            await self.rate_limiter.acquire_async()
+            try:
+                async with self.semaphore:
+                    # Timed inside the semaphore, so that the requests waiting for a slot are not measured
+                    with metrics.timer('async_scraper.AsyncScraper.get_page'):
+                        async with self.client.get(url) as response:
+                            if response.status in RETRY_STATUS_CODES:
+                                raise RetryableResponse(response.status,
+                                                        parse_retry_after(response.headers.get('Retry-After')))
+                            response.raise_for_status()
+                            text = await response.text()
+                page = html.fromstring(text)
+                self.rate_limiter.success()
+                return response, page
+            except aiohttp.ClientResponseError:
+                logging.warning('Page not found: {}'.format(url))
+                self.rate_limiter.success()
+                return None, None
+            except Exception as e:
+                tries += 1
+                retry_after = getattr(e, 'retry_after', None)
+                self.rate_limiter.failure(retry_after)
+                await asyncio.sleep(self.rate_limiter.get_backoff(tries, retry_after))
+        raise ValueError('Connection error: {}'.format(url))
+
+    async def _scrap_group_category(self, url):
+        logging.info(url)
+        r, page_html = await self.get_page(self.url + url)
+
+        # Page not found
+        if page_html is None:
+            return
+
+        categories = get_html_values(page_html, '//a[@data-qa=\"categoryLinkCta\"]/@href')
+        await asyncio.gather(*[self._scrap_category(category) for category in categories
+                               if not self._is_scraping_finished('categories', category)])
+        self._set_scraping_finished('group_categories', url)
+
+    async def _scrap_category(self, url):
+        logging.info('  {}'.format(url))
+        r, page_html = await self.get_page(self.url + url)
+
+        # Page not found
+        if page_html is None:
+            return
+
+        sub_categories = get_html_values(page_html, '//a[@data-qa=\"filterLinkCta\"]/@href')
+        await asyncio.gather(*[self._scrap_sub_category_pages(sub_category) for sub_category in sub_categories
+                               if not self._is_scraping_finished('sub_categories', sub_category)])
+        self._set_scraping_finished('categories', url)
+
+    async def _scrap_sub_category_pages(self, url):
+        # A sub category can be listed in several categories
+        if url in self.scheduled:
+            return
+        self.scheduled.add(url)
+
+        logging.info('    {}'.format(url))
+        # The next pages are fetched while waiting for the first one, until a page is missing
+        pending = collections.deque()
+        page = 1
+        while True:
+            while len(pending) < self.page_window:
+                pending.append(asyncio.ensure_future(self._try_scrap_sub_category(url, page)))
+                page += 1
+            if not await pending.popleft():
+                break
+        await asyncio.gather(*pending)
+        self._set_scraping_finished('sub_categories', url)
+
+    async def _try_scrap_sub_category(self, url, page=1):
+        """ When scraping failed on a page, we skip it by returning True and continue to the next page """
+        try:
+            return await self._scrap_sub_category(url, page)
+        except Exception as e:
+            logging.error(str(e))
+            return False
+
+    async def _scrap_sub_category(self, url, page=1):
+        """ Sub categories correspond to filters on categories """
+        if page > self.max_pages:
+            return False
+
+        if self.state.is_finished('pages', self._get_page_name(url, page)):
+            return False
+
+        r, page_html = await self.get_page(self._get_sub_category_url(url, page))
+        # Saved in a thread, so that the loop is not blocked by the writes, nor by a full pages queue
+        return await asyncio.to_thread(self._save_sub_category_page, url, page, r, page_html)
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+
+class HitsFrameBuilder:
+    """ Build a dataframe from json hits. Each hit is walked once to extract only the fields of the schema, a list of
+    (column, keys, function) where keys is the path of the field in the hit, and function an optional function
+    computing the column from the field value """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.columns = [column for column, _, _ in schema]
+        self.values = {column: [] for column in self.columns}
+
+    def __len__(self):
+        return len(self.values[self.columns[0]])
+
+    def extract(self, hit):
+        """ Extract a flat record from a hit. Missing fields are not in the record """
+        record = {}
+        for column, keys, function in self.schema:
+            value = get_json_value(hit, keys)
+            if function is not None:
+                value = function(value)
+            if value is not MISSING:
+                record[column] = value
+        return record
+
+    def append(self, records):
+        for record in records:
+            for column in self.columns:
+                self.values[column].append(record.get(column, np.nan))
+
+    def to_frame(self):
+        """ Build the dataframe and reset the builder """
+        data = pd.DataFrame(self.values, columns=self.columns)
+        self.values = {column: [] for column in self.columns}
+        return data
+
+
+MISSING = np.nan
+
+
+def get_json_value(data, keys):
+    """ Get the value at the path keys in a json node, or MISSING if there is no value """
+    for key in keys:
+        if not isinstance(data, dict) or key not in data:
+            return MISSING
+        data = data[key]
+    return data
+
+
+def strip(x):
+    return x.strip() if isinstance(x, str) else x
+
+
+def has_length(x):
+    try:
+        return len(x) > 0
+    except Exception:
+        return False
+
+
+def get_length(x):
+    try:
+        return len(x)
+    except Exception:
+        return 0
+
+
+def get_unique_length(x):
+    try:
+        return len(set(x))
+    except Exception:
+        return 0
+
+
+def get_topsales_length(x):
+    try:
+        return len([ts for ts in x if 'topSales' in ts])
+    except Exception:
+        return 0
+
+
+def get_first_stripped(x):
+    try:
+        return x[0].strip()
+    except Exception:
+        return MISSING
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from mano.metrics import metrics
+
+
+class CategoryRegistry:
+    """ Categories of each column, shared by the chunks so that their codes agree. Categories are only appended, so
+    that the codes already given remain valid as new values are registered """
+
+    def __init__(self):
+        self.categories = {}
+
+    def __contains__(self, column):
+        return column in self.categories
+
+    def encode(self, column, values):
+        """ Codes of the values in the categories of the column, -1 for missing values. Only the unique values of
+        categorical values are looked up """
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+            uniques = pd.Index(uniques, tupleize_cols=False)
+
+        categories = self.categories.get(column)
+        if categories is None:
+            categories = uniques
+        else:
+            new_values = uniques[categories.get_indexer(uniques) < 0]
+            if len(new_values) > 0:
+                categories = categories.append(new_values)
+        self.categories[column] = categories
+
+        # The last code maps missing values (-1) to -1
+        mapping = np.append(categories.get_indexer(uniques), -1).astype(np.int32)
+        return mapping[codes]
+
+    def pop(self, column):
+        return self.categories.pop(column)
+
+
+def estimate_cardinality(values, sample_size=10000, random_state=0):
+    """ Estimate the number of unique values from a sample. Exact for small arrays """
+    values = pd.Series(values)
+    if len(values) <= sample_size:
+        return values.nunique()
+    counts = values.sample(sample_size, random_state=random_state).value_counts()
+    return estimate_cardinality_from_counts(counts.to_numpy(), len(values))
+
+
+def estimate_cardinality_from_counts(counts, n_rows):
+    """ GEE estimate of the number of unique values of n_rows values, from the counts of the unique values of a
+    sample: values seen several times in the sample are counted once, and values seen once are scaled by
+    sqrt(n_rows / sample_size) """
+    sample_size = counts.sum()
+    if sample_size == 0 or sample_size >= n_rows:
+        return len(counts)
+    n_singletons = (counts == 1).sum()
+    return int(np.sqrt(n_rows / sample_size) * n_singletons) + len(counts) - n_singletons
+
+
+@metrics.timed()
+def to_categorical(values, max_unique_ratio=0.5):
+    """ Categorical of the values with sorted categories, like pd.Categorical, or None if they have max_unique_ratio
+    unique values or more. Values estimated to be mostly unique are not scanned, and the values are counted and
+    encoded with the same hash pass """
+    max_unique = max_unique_ratio * len(values)
+    if estimate_cardinality(values) >= max_unique:
+        return None
+    codes, uniques = pd.factorize(values)
+    if len(uniques) >= max_unique:
+        return None
+    return sort_categories(pd.Categorical.from_codes(codes, categories=pd.Index(uniques, tupleize_cols=False)))
+
+
+def sort_categories(values):
+    """ Sort the categories, if they can be compared """
+    try:
+        return values.reorder_categories(values.categories.sort_values())
+    except TypeError:
+        return values
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from mano.data.categories import CategoryRegistry, estimate_cardinality, to_categorical, sort_categories
+
+
+class StreamingConcat:
+    """ Concatenate dataframes one at a time, keeping the first row of each key """
+
+    def __init__(self, columns, key, max_unique_ratio=0.5):
+        self.columns = columns
+        self.key = key
+        self.max_unique_ratio = max_unique_ratio
+        self.seen = set()
+        self.index = []
+        self.values = {column: [] for column in columns}
+        self.registry = CategoryRegistry()
+
+    def __len__(self):
+        return len(self.seen)
+
+    def append(self, data):
+        """ Append the rows of the dataframe whose key has not been seen yet """
+        mask = np.zeros(len(data), dtype=bool)
+        for i, key in enumerate(data[self.key].to_numpy()):
+            if key not in self.seen:
+                self.seen.add(key)
+                mask[i] = True
+        if not mask.all():
+            data = data[mask]
+
+        self.index.append(data.index)
+        for column in self.columns:
+            series = data[column]
+            if self._is_categorical(column, series):
+                self.values[column].append(self.registry.encode(column, series))
+            else:
+                # Copied so that each column can be released on its own
+                self.values[column].append(series.copy())
+
+    def to_frame(self):
+        """ Build the dataframe, one column at a time, releasing its pieces once it is built """
+        if len(self.index) == 0:
+            return pd.DataFrame(columns=self.columns)
+
+        index = self.index[0].append(self.index[1:])
+        results = pd.DataFrame(index=index)
+        for column in self.columns:
+            if column in self.registry:
+                results[column] = self._decode(column, len(index))
+            else:
+                values = pd.concat(self.values.pop(column), ignore_index=True)
+                if pd.api.types.is_object_dtype(values):
+                    categorical = to_categorical(values, self.max_unique_ratio)
+                    values = values if categorical is None else categorical
+                results[column] = values.array if isinstance(values, pd.Series) else values
+        return results
+
+    def _is_categorical(self, column, series):
+        if column in self.registry or isinstance(series.dtype, pd.CategoricalDtype):
+            return True
+        return pd.api.types.is_object_dtype(series) and \
+            estimate_cardinality(series) < self.max_unique_ratio * len(series)
+
+    def _decode(self, column, n_rows):
+        # Pieces appended before the column was registered are encoded now
+        codes = [piece if isinstance(piece, np.ndarray) else self.registry.encode(column, piece)
+                 for piece in self.values.pop(column)]
+        categories = self.registry.pop(column)
+        values = pd.Categorical.from_codes(np.concatenate(codes), categories=categories).remove_unused_categories()
+        if len(values.categories) >= self.max_unique_ratio * n_rows:
+            return np.asarray(values)
+        return sort_categories(values)
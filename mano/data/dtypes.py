@@ -0,0 +1,158 @@
+import importlib.util
+import numpy as np
+import pandas as pd
+from mano.data.categories import CategoryRegistry, estimate_cardinality
+
+
+class DtypeOptimizer:
+    """ Find the smallest dtype holding the values of each column: downcast ints, float32 when the values are kept
+    within float_rtol, nullable Int and boolean for ints and flags with missing values, categoricals for strings with
+    less than max_unique_ratio unique values, and Arrow strings (if pyarrow is installed) for the other strings.
+    The optimizer can be fitted chunk by chunk, so that all the chunks of a dataset are given the same dtypes """
+
+    def __init__(self, float_rtol=1e-6, max_unique_ratio=0.5, string_dtype='auto'):
+        self.float_rtol = float_rtol
+        self.max_unique_ratio = max_unique_ratio
+        if string_dtype == 'auto':
+            string_dtype = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') is not None else None
+        self.string_dtype = string_dtype
+        self.stats = {}
+        self.registry = CategoryRegistry()
+        self.report = None
+
+    def fit(self, data):
+        """ Update the statistics of the columns with a chunk of the dataset """
+        for column in data.columns:
+            stats = self._get_stats(column, data[column])
+            if column in self.stats:
+                stats = self._merge_stats(self.stats[column], stats)
+            self.stats[column] = stats
+        return self
+
+    def get_dtypes(self):
+        """ Optimized dtype of each column, None if the column is kept as is """
+        return {column: self._get_dtype(column, stats) for column, stats in self.stats.items()}
+
+    def transform(self, data):
+        """ Convert the columns to their optimized dtype, and report the bytes saved per column """
+        dtypes = self.get_dtypes()
+        results = data.copy(deep=False)
+        for column, dtype in dtypes.items():
+            if column in results.columns and dtype is not None and results[column].dtype != dtype:
+                results[column] = results[column].astype(dtype)
+        self.report = get_memory_report(data, results)
+        return results
+
+    def _get_stats(self, column, series):
+        n_missing = int(series.isnull().sum())
+        stats = {'kind': 'other', 'rows': len(series), 'missing': n_missing > 0}
+        values = series.dropna() if n_missing > 0 else series
+
+        if len(values) == 0:
+            # Columns without values take the kind of the other chunks
+            stats['kind'] = 'missing'
+        elif pd.api.types.is_bool_dtype(series) or (pd.api.types.is_object_dtype(series) and is_bool_values(values)):
+            stats['kind'] = 'bool'
+        elif pd.api.types.is_integer_dtype(series) or pd.api.types.is_float_dtype(series):
+            values = values.to_numpy(dtype=np.float64) if pd.api.types.is_float_dtype(series) else values.to_numpy()
+            stats.update(kind='number', integral=bool(np.all(np.mod(values, 1) == 0)), min=values.min(),
+                         max=values.max(), float=pd.api.types.is_float_dtype(series))
+            if pd.api.types.is_float_dtype(series):
+                stats['float32'] = self._is_float32(values)
+        elif is_string_values(series, values):
+            # Strings are only registered if they may have few unique values
+            registered = isinstance(series.dtype, pd.CategoricalDtype) or \
+                estimate_cardinality(values) < self.max_unique_ratio * len(series)
+            if registered:
+                self.registry.encode(column, values)
+            stats.update(kind='string', registered=registered)
+        # Other columns, like mixed types or lists, are kept as is
+        return stats
+
+    def _merge_stats(self, a, b):
+        rows, missing = a['rows'] + b['rows'], a['missing'] or b['missing']
+        if a['kind'] == 'missing' or b['kind'] == 'missing':
+            stats = dict(b if a['kind'] == 'missing' else a)
+            stats.update(rows=rows, missing=missing)
+            return stats
+        if a['kind'] != b['kind'] or a['kind'] == 'other':
+            return {'kind': 'other', 'rows': rows, 'missing': missing}
+
+        stats = {'kind': a['kind'], 'rows': rows, 'missing': missing}
+        if a['kind'] == 'string':
+            stats['registered'] = a['registered'] and b['registered']
+        elif a['kind'] == 'number':
+            stats.update(integral=a['integral'] and b['integral'], float=a['float'] or b['float'],
+                         min=min(a['min'], b['min']), max=max(a['max'], b['max']),
+                         float32=a.get('float32', True) and b.get('float32', True))
+        return stats
+
+    def _get_dtype(self, column, stats):
+        if stats['kind'] == 'bool':
+            return 'boolean' if stats['missing'] else np.dtype(bool)
+        elif stats['kind'] == 'number':
+            dtype = get_int_dtype(stats['min'], stats['max']) if stats['integral'] else None
+            if stats['float'] or dtype is None:
+                float_dtype = np.dtype(np.float32) if stats.get('float32', False) else np.dtype(np.float64)
+                # Integral floats are only converted to ints if smaller, nullable ints taking a byte for their mask
+                if dtype is None or dtype.itemsize + stats['missing'] > float_dtype.itemsize:
+                    return float_dtype
+            # Nullable ints are named like the numpy ones, capitalized
+            return dtype.name.replace('u', 'U').replace('int', 'Int') if stats['missing'] else dtype
+        elif stats['kind'] == 'string':
+            # Categories must have been registered on all the chunks
+            if stats['registered'] and len(self.registry.categories[column]) < self.max_unique_ratio * stats['rows']:
+                categories = self.registry.categories[column]
+                try:
+                    categories = categories.sort_values()
+                except TypeError:
+                    pass
+                return pd.CategoricalDtype(categories)
+            return self.string_dtype
+        return None
+
+    def _is_float32(self, values):
+        with np.errstate(over='ignore', invalid='ignore'):
+            converted = values.astype(np.float32).astype(np.float64)
+            return bool(np.all(np.abs(converted - values) <= self.float_rtol * np.abs(values)))
+
+
+def is_string_values(series, values):
+    """ Check if a series holds strings only, as categories for a categorical """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return pd.api.types.infer_dtype(series.cat.categories, skipna=True) == 'string'
+    return (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)) and \
+        pd.api.types.infer_dtype(values, skipna=True) == 'string'
+
+
+def is_bool_values(values):
+    """ Check if the values of an object series are booleans only """
+    try:
+        uniques = values.unique()
+    except TypeError:
+        # Unhashable values, like lists
+        return False
+    return len(values) > 0 and all([isinstance(value, (bool, np.bool_)) for value in uniques])
+
+
+def get_int_dtype(vmin, vmax):
+    """ Smallest int dtype holding values from vmin to vmax, None if no int dtype can hold them """
+    vmin, vmax = int(vmin), int(vmax)
+    if vmin >= 0:
+        dtype = np.min_scalar_type(vmax)
+    else:
+        # A signed dtype holding -vmax - 1 also holds vmax
+        dtype = np.result_type(np.min_scalar_type(vmin), np.min_scalar_type(min(-vmax - 1, -1)))
+    return dtype if dtype.kind in 'iu' else None
+
+
+def get_memory_report(data, optimized):
+    """ Bytes used by each column before and after optimization """
+    report = pd.DataFrame({
+        'dtype': data.dtypes.astype(str),
+        'optimized_dtype': optimized.dtypes.astype(str),
+        'bytes': data.memory_usage(index=False, deep=True),
+        'optimized_bytes': optimized.memory_usage(index=False, deep=True)
+    })
+    report['saved_bytes'] = report['bytes'] - report['optimized_bytes']
+    return report
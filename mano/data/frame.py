@@ -1,5 +1,9 @@
+import logging
 import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from mano.data.categories import to_categorical, estimate_cardinality_from_counts
+from mano.data.dtypes import DtypeOptimizer, get_int_dtype
 
 
 @pd.api.extensions.register_dataframe_accessor("utils")
@@ -13,17 +17,35 @@ class DataframeAccessor:
         if not isinstance(df, pd.DataFrame):
             raise ValueError('Fluor is expecting a pandas dataframe, and not a {}'.format(type(df)))
 
-    def summary(self, width=120, minimal=True):
-        DataFrameAnalyzer(width, minimal).summary(self.df)
+    def summary(self, width=120, minimal=True, sample_size=None, n_threads=None):
+        return DataFrameAnalyzer(width, minimal, sample_size, n_threads).summary(self.df)
 
-    def to_categoricals(self):
+    def analyze(self, sample_size=None, n_threads=None):
+        """ Statistics of each column, as a dataframe """
+        return DataFrameAnalyzer(sample_size=sample_size, n_threads=n_threads).analyze(self.df)
+
+    def to_categoricals(self, max_unique_ratio=0.5):
+        """ Convert the object columns with less than max_unique_ratio unique values to categoricals """
         for c in self.df.columns:
             if pd.api.types.is_object_dtype(self.df[c]):
-                n = self.df[c].nunique()
-                if n < 0.5 * len(self.df):
-                    self.df[c] = pd.Categorical(self.df[c])
+                values = to_categorical(self.df[c], max_unique_ratio)
+                if values is not None:
+                    self.df[c] = values
         return self.df
 
+    def optimize_memory(self, optimizer=None):
+        """ Convert each column to the smallest dtype holding its values, and log the bytes saved per column. An
+        optimizer fitted on all the chunks of a dataset can be given, so that the chunks get the same dtypes """
+        if optimizer is None:
+            optimizer = DtypeOptimizer().fit(self.df)
+        results = optimizer.transform(self.df)
+        for column, row in optimizer.report.iterrows():
+            if row['saved_bytes'] != 0:
+                logging.info('{}: {} -> {}, {:,} bytes saved'.format(column, row['dtype'], row['optimized_dtype'],
+                                                                      row['saved_bytes']))
+        logging.info('Memory optimized: {:,} bytes saved'.format(optimizer.report['saved_bytes'].sum()))
+        return results
+
     def downcast_int_columns(self):
         for c in self.df.columns:
             if pd.api.types.is_integer_dtype(self.df[c]):
@@ -32,27 +54,32 @@ class DataframeAccessor:
 
 
 def downcast_int(series):
-    int_types = [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32, np.uint64, np.int64]
-    if not pd.api.types.is_integer_dtype(series):
+    if not pd.api.types.is_integer_dtype(series) or len(series) == 0:
         return series
-    vmin = series.min()
-    vmax = series.max()
-    for int_type in int_types:
-        if np.iinfo(int_type).min <= vmin and vmax <= np.iinfo(int_type).max:
-            return series.astype(int_type)
-    return series
+    dtype = get_int_dtype(series.min(), series.max())
+    return series if dtype is None or dtype == series.dtype else series.astype(dtype)
 
 
 class DataFrameAnalyzer:
+    """ Profile the columns of a dataframe: nulls, uniques, and min, median and max for floats and dates, or the most
+    frequent values for the other columns. Each column is profiled with a single value_counts, or a single sort for
+    floats and dates, and columns are spread over n_threads threads if set. If sample_size is set, larger frames are
+    profiled on a random sample of rows: nulls are scaled to the frame size, and uniques and quantiles are estimates """
+
+    COLUMNS = ['dtype', 'nulls', 'uniques', 'min', 'median', 'max', 'top_values']
 
-    def __init__(self, width=120, minimal=True):
+    def __init__(self, width=120, minimal=True, sample_size=None, n_threads=None, max_top_values=10, random_state=0):
         self.width = width
         self.minimal = minimal
+        self.sample_size = sample_size
+        self.n_threads = n_threads
+        self.max_top_values = max_top_values
+        self.random_state = random_state
 
-    def _build(self, df):
-        self.rows, self.columns = df.shape
+    def _build(self, rows, columns):
+        self.rows, self.columns = rows, len(columns)
         self.space_to_display_number_of_rows = len(str(self.rows))
-        self.column_name_width = max([len(str(c)) for c in df.columns])
+        self.column_name_width = max([len(str(c)) for c in columns])
 
         self.header = '{}column | {}nulls | {}uniques | type           | description{}'.format(
             ' ' * max(self.column_name_width - 6, 0),
@@ -69,51 +96,97 @@ class DataFrameAnalyzer:
 
         self.description_width = len(self.header.split('|')[-1]) - 1
 
+    def analyze(self, df):
+        """ Return the statistics of each column, as a dataframe indexed by the columns """
+        rows = len(df)
+        if self.sample_size is not None and rows > self.sample_size:
+            positions = np.random.RandomState(self.random_state).choice(rows, self.sample_size, replace=False)
+            df = df.iloc[np.sort(positions)]
+
+        columns = [df[column] for column in df.columns]
+        if self.n_threads is None:
+            results = [self._analyze_column(series, rows) for series in columns]
+        else:
+            with ThreadPoolExecutor(self.n_threads) as executor:
+                results = list(executor.map(self._analyze_column, columns, [rows] * len(columns)))
+        return pd.DataFrame(results, index=df.columns, columns=self.COLUMNS)
+
     def summary(self, df):
-        self._build(df)
+        results = self.analyze(df)
+        self.print_summary(results, len(df))
+        return results
+
+    def print_summary(self, results, rows):
+        """ Print the statistics of the columns of a dataframe with the given rows """
+        self._build(rows, results.index)
         print('{:,} rows x {:,} columns'.format(self.rows, self.columns))
         print(self.header)
         print('-' * self.width)
-        for column in df.columns:
-            column_name = str(column)
-            n_nulls = df[column].isnull().sum()
-            n_unique = df[column].nunique()
-            description = self._get_description(df[column])
-            row = self.row_format % (column_name, n_nulls, n_unique, df[column].dtype, description)
+        for column, stats in results.iterrows():
+            description = self._get_description(stats)
+            row = self.row_format % (str(column), stats['nulls'], stats['uniques'], stats['dtype'], description)
             print(row[:self.width])
 
-    def _get_description(self, series):
-        if pd.api.types.is_float_dtype(series):
-            return self._get_float_description(series)
-        elif pd.api.types.is_datetime64_any_dtype(series):
-            return self._get_date_description(series)
+    def _analyze_column(self, series, rows):
+        """ Statistics of a column, scaled to the frame rows if the column is sampled """
+        stats = {'dtype': series.dtype, 'min': np.nan, 'median': np.nan, 'max': np.nan, 'top_values': []}
+        if pd.api.types.is_float_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            values = series.dropna()
+            values = np.sort(values.to_numpy(dtype=np.float64) if pd.api.types.is_float_dtype(series) else
+                             values.to_numpy())
+            if len(values) > 0:
+                n = len(values)
+                stats.update(min=values[0], max=values[-1])
+                if pd.api.types.is_float_dtype(series):
+                    stats['median'] = (values[(n - 1) // 2] + values[n // 2]) / 2
+            # Counts of the unique values, from the runs of equal values
+            starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]]) if len(values) > 0 else np.array([], int)
+            counts = np.diff(np.r_[starts, len(values)])
+        else:
+            value_counts = series.value_counts(dropna=True)
+            value_counts = value_counts[value_counts > 0]
+            counts = value_counts.to_numpy()
+            stats['top_values'] = [(value, count / len(series))
+                                   for value, count in value_counts.head(self.max_top_values).items()]
+
+        n_values = counts.sum()
+        if len(series) < rows:
+            stats['nulls'] = int(round((len(series) - n_values) * rows / len(series)))
+            stats['uniques'] = estimate_cardinality_from_counts(counts, rows - stats['nulls'])
         else:
-            return self._get_category_description(series)
+            stats['nulls'] = len(series) - n_values
+            stats['uniques'] = len(counts)
+        return stats
+
+    def _get_description(self, stats):
+        if pd.api.types.is_float_dtype(stats['dtype']):
+            return self._get_float_description(stats)
+        elif pd.api.types.is_datetime64_any_dtype(stats['dtype']):
+            return self._get_date_description(stats)
+        else:
+            return self._get_category_description(stats)
 
-    def _get_float_description(self, series):
-        smin = series.min()
-        smax = series.max()
-        smed = series.median()
-        description = '[min={:.1f}, q50%={:.1f}, max={:.1f}]'.format(smin, smed, smax)
+    def _get_float_description(self, stats):
+        description = '[min={:.1f}, q50%={:.1f}, max={:.1f}]'.format(stats['min'], stats['median'], stats['max'])
         if len(description) > self.description_width:
-            description = 'q50%={:.1f}'.format(smed)
+            description = 'q50%={:.1f}'.format(stats['median'])
         if len(description) > self.description_width:
             description = ''
         return description
 
-    def _get_date_description(self, series):
-        dmin = series.min()
-        dmax = series.max()
+    def _get_date_description(self, stats):
+        dmin, dmax = stats['min'], stats['max']
+        if not pd.isnull(dmin):
+            dmin, dmax = pd.Timestamp(dmin), pd.Timestamp(dmax)
         description = '[{} to {}]'.format(dmin, dmax)
         if len(description) > self.description_width:
             description = ''
         return description
 
-    def _get_category_description(self, series):
+    def _get_category_description(self, stats):
         description = ''
-        values = series.value_counts()
-        for i, v in values.items():
-            value_description = '{} ({:.0%})'.format(i, v / self.rows)
+        for i, ratio in stats['top_values']:
+            value_description = '{} ({:.0%})'.format(i, ratio)
             if description == '':
                 if len(value_description) <= self.description_width:
                     description = value_description
@@ -124,4 +197,4 @@ class DataFrameAnalyzer:
                     description += ', ' + value_description
                 else:
                     break
-        return description
\ No newline at end of file
+        return description
@@ -1,13 +1,25 @@
 import os
 import logging
+import collections
 import progressbar
-import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from mano.metrics import metrics
+from mano.data.pages import get_page_store, is_records_page
+from mano.data.storage import get_storage, filter_dataframe, iter_filters
+from mano.data.manifest import Manifest
+from mano.data.concat import StreamingConcat
+from mano.data.sketches import FrameSketch
+from mano.data.frame import DataFrameAnalyzer
 from aikit.tools.helper_functions import load_pkl, save_pkl
-from mano.data.utils import load_data_from_dirty_json_file, chunks
+from mano.data.builder import HitsFrameBuilder, strip, has_length, get_length, get_unique_length, \
+    get_topsales_length, get_first_stripped
 
 
 class DataManager:
 
+    CHUNK_SIZE = 1000
+
     JSON_FIELDS_TO_MAP = [
         {
             'keys': ['delivery_offers', 'min_fee', 'as_float'],
@@ -51,20 +63,6 @@ class DataManager:
         }
     ]
 
-    JSON_FIELDS_TO_DELETE = [
-        'detail_price', 'is_seller_b2b', 'is_mmf', 'has_3x_payment', 'market', 'model_markets', 'is_sample', 'has_sample',
-        'image_fullpath', 'brand_image_fullpath', 'url', 'default_title', 'legacy_unit',
-        'attribute_facet', 'top_attributes', 'catalog_attribute', 'reranking_positions', 'reranking_positions.alternate',
-        'categories.l3', 'categories.l3.id', 'categories.last_id', 'category_slug', 'banner.alternate',
-        'experiences', 'score', 'me_id', 'energy_efficiency',
-        'seller_id', 'brand_id', 'categories.l0.id', 'categories.l1.id', 'categories.l2.id', 'categories.last.id'
-    ]
-
-    COLUMNS_TO_DELETE = [
-        'image_path', 'brand_image_path', 'thumbnails', 'catalog_attribute_facet', 'banner.categories',
-        'banner.default'
-    ]
-
     COLUMNS = [
         'objectID', 'model_id', 'article_id', 'title',
         'price', 'vat_rate', 'ecopart', 'discount', 'delivery_offers_min_fee', 'ranking_score_v1',
@@ -75,159 +73,254 @@ class DataManager:
         'has_brand_image','has_free_delivery', 'has_relay_delivery', 'has_1day_delivery', 'on_sale', 'indexable'
     ]
 
-    def __init__(self, path):
+    # Columns computed from a json field while extracting the hits
+    COLUMNS_FEATURES = {
+        'title': (['title'], strip),
+        # We compress some features we don't want to use as is, like arrays
+        'has_brand_image': (['brand_image_path'], has_length),
+        'n_thumbnails': (['thumbnails'], get_length),
+        'n_attributes': (['catalog_attribute_facet'], get_length),
+        'n_topsales': (['banner', 'categories'], get_topsales_length),
+        'n_categories.l0': (['categories', 'l0'], get_unique_length),
+        'n_categories.l1': (['categories', 'l1'], get_unique_length),
+        'n_categories.l2': (['categories', 'l2'], get_unique_length),
+        # We assign to main categories
+        'categories.l0': (['categories', 'l0'], get_first_stripped),
+        'categories.l1': (['categories', 'l1'], get_first_stripped),
+        'categories.l2': (['categories', 'l2'], get_first_stripped),
+        'categories.last': (['categories', 'last'], get_first_stripped)
+    }
+
+    def __init__(self, path, n_workers=None, storage='pickle', pages='files'):
         self.path = path
-        self.data_path = os.path.join(path, 'data')
+        self.n_workers = n_workers
+        self.storage = get_storage(storage)
+        self.pages = get_page_store(pages, path)
         self.processed_path = os.path.join(path, 'processed')
-        self.cache_file = os.path.join(path, 'cache.pkl')
-        self.files = sorted(os.listdir(self.data_path))
-        self.mapping = {}
+        self.cache_file = os.path.join(path, 'cache' + self.storage.extension)
+        self.manifest = Manifest(os.path.join(path, 'manifest.json'))
 
         if not os.path.exists(self.processed_path):
             os.mkdir(self.processed_path)
 
-    def load(self):
-        """ Process and load the scraped data to a pandas dataframe """
-        if os.path.exists(self.cache_file):
-            return load_pkl(self.cache_file)
-
-        self._process_files_chunks()
-        results = self._concat_chunks()
-        save_pkl(results, self.cache_file)
-        return results
-
-    def _process_files_chunks(self):
-        """ Process files by chunks of ~1000 to allow fast recovery """
-        files_chunks = chunks(self.files, 1000)
-
-        for i, files in enumerate(files_chunks):
-            logging.info('---- Chunk {}'.format(i))
-            processed_file = os.path.join(self.processed_path, 'chunk_{}.pkl'.format(i))
-            if os.path.exists(processed_file):
-                continue
-
-            results = []
-            for file in progressbar.progressbar(files):
-                r = self._process_file(file)
-                if r is not None:
-                    results.append(r)
-
-            results = pd.concat(results, sort=False)
-            # Drop duplicates objects
-            results = results.drop_duplicates('objectID')
-            save_pkl(results, processed_file)
-
-    def _concat_chunks(self):
-        """ Concatenate the processed chunks into one dataset"""
-        results = [load_pkl(os.path.join(self.processed_path, chunk)) for chunk in os.listdir(self.processed_path)]
-        results = pd.concat(results, sort=False)
-        results = results[self.COLUMNS]
-        results = results.drop_duplicates('objectID')
-        results = results.utils.to_categoricals()
+    def __getstate__(self):
+        # The manifest is only used by the main process, it is not sent to the workers
+        state = self.__dict__.copy()
+        del state['manifest']
+        return state
+
+    def load(self, columns=None, filters=None):
+        """ Process and load the scraped data to a pandas dataframe. Only new or changed files are processed and merged
+        into the cached dataset. Only the given columns and the rows matching the filters (in pyarrow format, like
+        [('seller_name', '==', 'x')]) are returned """
+        self._update_manifest()
+        files_chunks = self.manifest.get_chunks()
+        self._process_files_chunks(files_chunks)
+
+        cache_chunks = self.manifest.cache_chunks
+        if cache_chunks is None or not os.path.exists(self.cache_file) or not set(cache_chunks) <= set(files_chunks):
+            results = self._concat_chunks(sorted(files_chunks))
+        elif set(cache_chunks) == set(files_chunks):
+            return self.storage.load(self.cache_file, columns=columns, filters=filters)
+        else:
+            new_chunks = sorted(set(files_chunks) - set(cache_chunks))
+            logging.info('Merging {} new chunks into the cache'.format(len(new_chunks)))
+            results = self._concat_chunks(new_chunks, self.storage.load(self.cache_file))
+
+        self.storage.save(results, self.cache_file)
+        self.manifest.cache_chunks = sorted(files_chunks)
+        self.manifest.save()
+        return filter_dataframe(results, columns, filters)
+
+    def iter_chunks(self, columns=None, filters=None):
+        """ Process the scraped data and yield the processed chunks one at a time, so that the dataset can be
+        streamed without being loaded, e.g. to predict it by batches. Objects already yielded by a previous chunk
+        are dropped, like in load() """
+        self._update_manifest()
+        files_chunks = self.manifest.get_chunks()
+        self._process_files_chunks(files_chunks)
+
+        seen = set()
+        load_columns = None
+        if columns is not None:
+            # Duplicates are dropped before the filters, like in load(), so the filters columns are loaded too
+            needed = ['objectID'] + [column for column, _, _ in iter_filters(filters or [])]
+            load_columns = list(columns) + [column for column in dict.fromkeys(needed) if column not in columns]
+        for i in sorted(files_chunks):
+            chunk = self.storage.load(self._get_chunk_file(i), columns=load_columns)
+            mask = np.zeros(len(chunk), dtype=bool)
+            for j, key in enumerate(chunk['objectID'].to_numpy()):
+                if key not in seen:
+                    seen.add(key)
+                    mask[j] = True
+            if not mask.all():
+                chunk = chunk[mask]
+            chunk = filter_dataframe(chunk, columns, filters)
+            if len(chunk) > 0:
+                yield chunk
+
+    def summary(self, width=120):
+        """ Print and return the statistics of the dataset, merged from the sketches saved with the chunks, so that
+        only the new chunks are processed. Rows are counted before the duplicates across chunks are dropped, and the
+        uniques and medians are estimates """
+        self._update_manifest()
+        files_chunks = self.manifest.get_chunks()
+        self._process_files_chunks(files_chunks)
+
+        sketch = FrameSketch(0, {})
+        for i in sorted(files_chunks):
+            sketch = sketch.merge(self._get_sketch(i))
+        results = sketch.to_frame()
+        DataFrameAnalyzer(width).print_summary(results, sketch.rows)
         return results
 
-    def _process_file(self, file):
-        """ Process a single file """
-        file_path = os.path.join(self.data_path, file)
-        with open(file_path, 'r', encoding='utf-8') as file_stream:
-            data = file_stream.read()
-
-        data = load_data_from_dirty_json_file(data)
-        if data is None:
-            return None
-        data = data[0]['hits']
-        data = self._preprocess_json(data)
-        data = pd.json_normalize(data)
-        data = self._reduce_memory_size(data)
-        data = data[[c for c in self.COLUMNS if c in data.columns]]
-        return data
-
-    def _preprocess_json(self, data):
-        """ Remove useless info from json data to facilitate dataframe conversion """
-        for d in data:
-            # We map the catalog_attribute_facet to a list of label / value for it to fit in a single dataframe column
-            if 'catalog_attribute_facet' in d:
-                d['catalog_attribute_facet'] = [{'label': k, 'value': v} for k, v in d['catalog_attribute_facet'].items()]
-
-            for mapping in self.JSON_FIELDS_TO_MAP:
-                self._map_json(d, mapping['keys'], mapping['key'])
-
-            # delete useless fields after having performed mapping
-            for key_to_delete in set([m['keys'][0] for m in self.JSON_FIELDS_TO_MAP]):
-                if key_to_delete in d:
-                    del d[key_to_delete]
-
-            # delete useless fields
-            for field in self.JSON_FIELDS_TO_DELETE:
-                if field in d:
-                    del d[field]
-        return data
-
-    def _reduce_memory_size(self, data):
-        # Strip some text
-        data['title'] = data['title'].apply(lambda s: s.strip())
-
-        # We compress some features we don't want to use as is, like arrays
-        #data['has_image'] = data['image_path'].apply(lambda x: ~pd.isnull(x) and len(x) > 0)
-        data['has_brand_image'] = data['brand_image_path'].apply(lambda x: ~pd.isnull(x) and len(x) > 0)
-
-        def get_length(x):
-            try:
-                return len(x)
-            except Exception as e:
-                return 0
-
-        def get_unique_length(x):
-            try:
-                return len(set(x))
-            except Exception as e:
-                return 0
-
-        def get_topsales_length(x):
-            try:
-                return len([ts for ts in x if 'topSales' in ts])
-            except Exception:
-                return 0
-
-        data['n_thumbnails'] = data['thumbnails'].apply(get_length)
-        if 'catalog_attribute_facet' in data.columns:
-            data['n_attributes'] = data['catalog_attribute_facet'].apply(get_length)
+    def _update_manifest(self):
+        """ Assign new or changed files to new chunks, and delete the chunks which are no longer valid """
+        signatures = {file: self.pages.get_signature(file) for file in self.pages.keys()}
+        invalidated = self.manifest.update(signatures, self.CHUNK_SIZE)
+        for i in invalidated:
+            logging.info('---- Chunk {} invalidated'.format(i))
+            for file in [self._get_chunk_file(i), self._get_sketch_file(i)]:
+                if os.path.exists(file):
+                    os.remove(file)
+        self.manifest.save()
+
+    def ingest(self, pages_queue):
+        """ Process the pages pushed on the queue by a running Scraper, until None is received. Pages are grouped into
+        chunks of CHUNK_SIZE, processed while the crawl goes on. At most n_workers chunks are processed at once: the
+        queue is not consumed meanwhile, so that the Scraper blocks on it when the processing lags """
+        executor = ProcessPoolExecutor(self.n_workers) if self.n_workers is not None else None
+        futures = collections.deque()
+        files = []
+        try:
+            for file in iter(pages_queue.get, None):
+                files.append(file)
+                if len(files) == self.CHUNK_SIZE:
+                    self._ingest_chunk(files, executor, futures)
+                    files = []
+            self._ingest_chunk(files, executor, futures)
+            while len(futures) > 0:
+                logging.info('---- Chunk {} done'.format(futures.popleft().result()))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def _ingest_chunk(self, files, executor, futures):
+        """ Assign the new files to a new chunk, recorded in the manifest before being processed so that it is
+        processed by load() if interrupted """
+        signatures = {file: self.pages.get_signature(file) for file in files if file not in self.manifest.files}
+        if len(signatures) == 0:
+            return
+        i = self.manifest.add(signatures)
+        self.manifest.save()
+
+        if executor is None:
+            self._process_chunk(i, sorted(signatures))
         else:
-            data['n_attributes'] = 0
-        if 'banner.categories' in data.columns:
-            data['n_topsales'] = data['banner.categories'].apply(get_topsales_length)
+            if len(futures) >= self.n_workers:
+                logging.info('---- Chunk {} done'.format(futures.popleft().result()))
+            futures.append(executor.submit(self._process_chunk, i, sorted(signatures)))
+
+    def _process_files_chunks(self, files_chunks):
+        """ Process files by chunks of ~1000 to allow fast recovery. Chunks are spread over a process pool if
+        n_workers is set """
+        files_chunks = [(i, files) for i, files in sorted(files_chunks.items())
+                        if not os.path.exists(self._get_chunk_file(i))]
+        if len(files_chunks) == 0:
+            return
+
+        if self.n_workers is None:
+            for i, files in files_chunks:
+                self._process_chunk(i, files)
         else:
-            data['n_topsales'] = 0
-
-        data['n_categories.l0'] = data['categories.l0'].apply(get_unique_length)
-        data['n_categories.l1'] = data['categories.l1'].apply(get_unique_length)
-        data['n_categories.l2'] = data['categories.l2'].apply(get_unique_length)
-
-        # We assign to main categories, and map categories to categories.id
-        data['categories.l0'] = data['categories.l0'].apply(lambda a: a[0].strip())
-        data['categories.l1'] = data['categories.l1'].apply(lambda a: a[0].strip())
-        data['categories.l2'] = data['categories.l2'].apply(lambda a: a[0].strip())
-        data['categories.last'] = data['categories.last'].apply(lambda a: a[0].strip())
-
-        to_delete = list(set(self.COLUMNS_TO_DELETE).intersection(data.columns))
-        data = data.drop(columns=to_delete)
-        # We downcast int types to save some memory
-        data = data.utils.downcast_int_columns()
-        return data
-
-    @staticmethod
-    def _map_json(data, initial_keys, final_key):
-        """ Simplify the json by pushing interesting data to top level """
-        current_node = data
-        for key in initial_keys:
-            if key in current_node:
-                current_node = current_node[key]
+            with ProcessPoolExecutor(self.n_workers) as executor:
+                for i in executor.map(self._process_chunk, *zip(*files_chunks)):
+                    logging.info('---- Chunk {} done'.format(i))
+
+    @metrics.timed()
+    def _process_chunk(self, i, files):
+        """ Process a chunk of files and save the results, so that the chunk is skipped when recovering """
+        logging.info('---- Chunk {}'.format(i))
+        if self.n_workers is None:
+            files = progressbar.progressbar(files)
+
+        builder = self.get_builder()
+        for file in files:
+            records = self._process_file(file, builder)
+            if records is not None:
+                builder.append(records)
+
+        # The dataframe is built once for the whole chunk
+        with metrics.timer('manager.build_frame'):
+            results = builder.to_frame()
+        results = self._reduce_memory_size(results)
+        # Drop duplicates objects
+        results = results.drop_duplicates('objectID')
+        metrics.count('manager.rows', len(results))
+        with metrics.timer('manager.save_chunk'):
+            self.storage.save(results, self._get_chunk_file(i))
+            save_pkl(FrameSketch.from_frame(results), self._get_sketch_file(i))
+        return i
+
+    @classmethod
+    def get_builder(cls):
+        """ Builder extracting the COLUMNS from the json hits """
+        mapped_keys = {mapping['key']: mapping['keys'] for mapping in cls.JSON_FIELDS_TO_MAP}
+        schema = []
+        for column in cls.COLUMNS:
+            if column in cls.COLUMNS_FEATURES:
+                keys, function = cls.COLUMNS_FEATURES[column]
             else:
-                current_node = None
-            if current_node is None:
-                break
-        # map value to top level
-        if current_node is not None:
-            data[final_key] = current_node
-
+                keys, function = mapped_keys.get(column, column.split('.')), None
+            schema.append((column, keys, function))
+        return HitsFrameBuilder(schema)
+
+    def _get_chunk_file(self, i):
+        return os.path.join(self.processed_path, 'chunk_{}{}'.format(i, self.storage.extension))
+
+    def _get_sketch_file(self, i):
+        return os.path.join(self.processed_path, 'chunk_{}.sketch.pkl'.format(i))
+
+    def _get_sketch(self, i):
+        """ Load the sketch of a chunk, computed from the chunk if it was processed without sketch """
+        if not os.path.exists(self._get_sketch_file(i)):
+            save_pkl(FrameSketch.from_frame(self.storage.load(self._get_chunk_file(i))), self._get_sketch_file(i))
+        return load_pkl(self._get_sketch_file(i))
+
+    @metrics.timed()
+    def _concat_chunks(self, chunks, initial=None):
+        """ Concatenate the processed chunks into one dataset, in the chunks order so that duplicates are dropped
+        deterministically. New chunks can be appended to an initial dataset. Chunks are loaded and merged one at a
+        time, so that the memory used stays close to the dataset size """
+        results = StreamingConcat(self.COLUMNS, 'objectID')
+        if initial is not None:
+            results.append(initial)
+            del initial
+        for i in chunks:
+            chunk = self.storage.load(self._get_chunk_file(i))
+            if len(chunk) > 0:
+                results.append(chunk)
+            del chunk
+        return results.to_frame()
+
+    @metrics.timed()
+    def _process_file(self, file, builder):
+        """ Extract the records of a single file, streaming its hits one at a time. Records extracted at scraping
+        time are read as is """
+        try:
+            if is_records_page(file):
+                records = self.pages.read_records(file)
+            else:
+                records = [builder.extract(hit) for hit in self.pages.iter_hits(file)]
+        except ValueError as e:
+            logging.error('{}: {}'.format(file, e))
+            return None
+        metrics.count('manager.files')
+        metrics.count('manager.hits', len(records))
+        return records
 
+    @metrics.timed()
+    def _reduce_memory_size(self, data):
+        # We downcast int types to save some memory, and encode the chunk categoricals in the workers, so that only
+        # their categories are merged when concatenating the chunks
+        return data.utils.downcast_int_columns().utils.to_categoricals()
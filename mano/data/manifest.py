@@ -0,0 +1,62 @@
+import os
+import json
+from mano.data.utils import chunks
+
+
+class Manifest:
+    """ Keep track of the scraped files which have been processed: their signature (size and modification time)
+    and the chunk they belong to, as well as the chunks consolidated in the cache """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.next_chunk = 0
+        self.cache_chunks = None
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file:
+                manifest = json.load(file)
+            self.files = manifest['files']
+            self.next_chunk = manifest['next_chunk']
+            self.cache_chunks = manifest['cache_chunks']
+
+    def save(self):
+        """ Save the manifest atomically, so that it is never left half written """
+        manifest = {'files': self.files, 'next_chunk': self.next_chunk, 'cache_chunks': self.cache_chunks}
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(manifest, file)
+        os.replace(temporary_path, self.path)
+
+    def get_chunks(self):
+        """ Return the files of each chunk """
+        results = {}
+        for file in sorted(self.files):
+            results.setdefault(self.files[file]['chunk'], []).append(file)
+        return results
+
+    def update(self, signatures, chunk_size):
+        """ Compare the files signatures with the manifest. Chunks containing changed or deleted files are invalidated
+        and their files are assigned, with the new files, to new chunks. Return the invalidated chunks """
+        invalidated = set()
+        for file, entry in self.files.items():
+            if signatures.get(file) != entry['signature']:
+                invalidated.add(entry['chunk'])
+
+        self.files = {file: entry for file, entry in self.files.items() if entry['chunk'] not in invalidated}
+        new_files = sorted([file for file in signatures if file not in self.files])
+        for files in chunks(new_files, chunk_size):
+            self.add({file: signatures[file] for file in files})
+        return invalidated
+
+    def add(self, signatures):
+        """ Assign new files to a new chunk, and return it """
+        for file in sorted(signatures):
+            self.files[file] = {'signature': signatures[file], 'chunk': self.next_chunk}
+        self.next_chunk += 1
+        return self.next_chunk - 1
+
+
+def get_file_signature(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
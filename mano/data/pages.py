@@ -0,0 +1,162 @@
+import os
+import gzip
+import json
+import threading
+from mano.data.manifest import get_file_signature
+from mano.data.stream import iter_hits_from_dirty_json_file, iter_hits_from_json_text
+
+
+class FilePageStore:
+    """ One file per page in the data folder, holding the str() of the listing scripts, or the json lines of the
+    records extracted from the page """
+
+    def __init__(self, path):
+        self.data_path = os.path.join(path, 'data')
+        if not os.path.exists(self.data_path):
+            os.mkdir(self.data_path)
+
+    def write(self, name, scripts):
+        with open(os.path.join(self.data_path, name), 'w', encoding='utf-8') as file:
+            file.write(str(scripts))
+
+    def write_records(self, name, records):
+        """ Save the records extracted from a page, as json lines """
+        with open(os.path.join(self.data_path, name), 'w', encoding='utf-8') as file:
+            file.write(''.join([json.dumps(record, ensure_ascii=False) + '\n' for record in records]))
+
+    def read_records(self, name):
+        with open(os.path.join(self.data_path, name), 'r', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def keys(self):
+        return os.listdir(self.data_path)
+
+    def get_signature(self, name):
+        return get_file_signature(os.path.join(self.data_path, name))
+
+    def iter_hits(self, name):
+        return iter_hits_from_dirty_json_file(os.path.join(self.data_path, name))
+
+
+class SegmentPageStore:
+    """ Raw listing scripts appended as json lines to gzip segments, rotating once segment_size bytes are written.
+    Records extracted from a page are stored the same way. Each page is a separate gzip member, located by an index
+    of (segment, offset, length), so that pages can be read with random access, while a segment remains a valid gzip
+    file """
+
+    def __init__(self, path, segment_size=64 * 2 ** 20):
+        self.segments_path = os.path.join(path, 'segments')
+        self.index_path = os.path.join(self.segments_path, 'index.jsonl')
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        if not os.path.exists(self.segments_path):
+            os.mkdir(self.segments_path)
+        self._load_index()
+
+    def __getstate__(self):
+        # The store can be pickled for the workers while pages are still being written
+        with self.lock:
+            state = self.__dict__.copy()
+            state['index'] = dict(self.index)
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def write(self, name, scripts):
+        self._write(name, {'page': name, 'payload': '\n'.join(scripts)})
+
+    def write_records(self, name, records):
+        """ Save the records extracted from a page """
+        self._write(name, {'page': name, 'records': records})
+
+    def _write(self, name, record):
+        data = gzip.compress((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        with self.lock:
+            segment_path = self._get_segment_path(self.segment)
+            if os.path.exists(segment_path) and os.path.getsize(segment_path) >= self.segment_size:
+                self.segment += 1
+                segment_path = self._get_segment_path(self.segment)
+            with open(segment_path, 'ab') as file:
+                offset = file.tell()
+                file.write(data)
+            # The page is indexed once written, so that an interrupted write leaves no broken entry
+            entry = [self.segment, offset, len(data)]
+            with open(self.index_path, 'a') as file:
+                file.write(json.dumps({'page': name, 'location': entry}) + '\n')
+            self.index[name] = entry
+
+    def read(self, name):
+        """ Read the raw listing scripts of a page """
+        return self._read(name)['payload']
+
+    def read_records(self, name):
+        return self._read(name)['records']
+
+    def _read(self, name):
+        segment, offset, length = self._get_location(name)
+        with open(self._get_segment_path(segment), 'rb') as file:
+            file.seek(offset)
+            data = file.read(length)
+        return json.loads(gzip.decompress(data).decode('utf-8'))
+
+    def keys(self):
+        with self.lock:
+            self._load_index()
+            return list(self.index)
+
+    def get_signature(self, name):
+        return self._get_location(name)
+
+    def iter_hits(self, name):
+        return iter_hits_from_json_text(self.read(name))
+
+    def _get_location(self, name):
+        """ Location of a page. The index is reloaded for unknown pages, which may have been written by another store
+        of the same path, like the one of a running scraper """
+        if name not in self.index:
+            with self.lock:
+                self._load_index()
+        return self.index[name]
+
+    def _load_index(self):
+        """ Reload the index, with the lock held. The new index is swapped in once complete, so that readers never
+        see it partially loaded """
+        index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as file:
+                for line in file:
+                    # Skip a line left incomplete by an interruption
+                    if line.endswith('\n'):
+                        entry = json.loads(line)
+                        index[entry['page']] = entry['location']
+        self.index = index
+        self.segment = max([location[0] for location in index.values()], default=0)
+
+    def _get_segment_path(self, segment):
+        return os.path.join(self.segments_path, 'segment-{:05d}.jsonl.gz'.format(segment))
+
+
+RECORDS_EXTENSION = '.jsonl'
+
+
+def is_records_page(name):
+    """ Pages holding the records extracted at scraping time, instead of the listing scripts """
+    return name.endswith(RECORDS_EXTENSION)
+
+
+PAGE_STORES = {
+    'files': FilePageStore,
+    'segments': SegmentPageStore
+}
+
+
+def get_page_store(pages, path):
+    """ Get a page store from its name, or return the page store instance given """
+    if isinstance(pages, str):
+        if pages not in PAGE_STORES:
+            raise ValueError('Unknown page store {}, expecting one of {}'.format(pages, list(PAGE_STORES)))
+        return PAGE_STORES[pages](path)
+    return pages
@@ -0,0 +1,46 @@
+import queue
+import logging
+import threading
+
+
+def crawl_and_load(scraper, manager, max_queue_size=None, columns=None, filters=None):
+    """ Run the scraper in a thread, pushing the saved pages on a bounded queue, while the manager processes them into
+    chunks. The dataset is loaded once the crawl is done, so that the wall time is about the longest of both """
+    pages_queue = queue.Queue(max_queue_size or 2 * manager.CHUNK_SIZE)
+    scraper.pages_queue = pages_queue
+    errors = []
+    thread = threading.Thread(target=_run_scraper, args=(scraper, pages_queue, errors))
+    thread.start()
+    try:
+        manager.ingest(pages_queue)
+    except Exception:
+        # Let the crawl go on without waiting for the processing, its pages are processed by the next load()
+        scraper.pages_queue = None
+        while thread.is_alive():
+            _drain(pages_queue)
+            thread.join(1)
+        raise
+    thread.join()
+    scraper.pages_queue = None
+
+    if len(errors) > 0:
+        raise errors[0]
+    return manager.load(columns, filters)
+
+
+def _run_scraper(scraper, pages_queue, errors):
+    try:
+        scraper.run()
+    except Exception as e:
+        logging.error('Crawl failed: {}'.format(e))
+        errors.append(e)
+    finally:
+        pages_queue.put(None)
+
+
+def _drain(pages_queue):
+    while True:
+        try:
+            pages_queue.get_nowait()
+        except queue.Empty:
+            return
@@ -4,15 +4,22 @@ import logging
 import requests
 import threading
 from lxml import html
+from mano.metrics import metrics
 from mano.data.utils import get_html_values
+from mano.data.state import CrawlState
+from mano.data.pages import get_page_store, RECORDS_EXTENSION
+from mano.data.stream import iter_hits_from_json_text
+from mano.data.throttle import RateLimiter, RetryableResponse, RETRY_STATUS_CODES, parse_retry_after
 
 
 class ThreadedScraper(threading.Thread):
 
     def __init__(self, scraper, url, page):
-        # Instanciate a new scraper to have a unique Session per thread
+        # Instanciate a new scraper to have a unique Session per thread, sharing the rate limiter and crawl state
         threading.Thread.__init__(self)
-        self.scraper = Scraper(scraper.url, scraper.save_path, scraper.max_pages)
+        self.scraper = Scraper(scraper.url, scraper.save_path, scraper.max_pages, rate_limiter=scraper.rate_limiter,
+                               state=scraper.state, pages=scraper.pages, extract_hits=scraper.extract_hits,
+                               pages_queue=scraper.pages_queue)
         self.url = url
         self.page = page
 
@@ -22,55 +29,63 @@ class ThreadedScraper(threading.Thread):
 
 class Scraper:
 
-    def __init__(self, url, save_path=None, max_pages=None, n_threads=None):
+    def __init__(self, url, save_path=None, max_pages=None, n_threads=None, rate_limiter=None, state=None,
+                 pages='files', extract_hits=False, pages_queue=None):
         self.url = url
         self.save_path = save_path
-        self.data_path = os.path.join(save_path, 'data')
         self.max_pages = max_pages or 1000
         self.timeout = 10
-        self.sleep_time = 60
         self.max_tries = 5
         self.n_threads = n_threads
+        self.rate_limiter = rate_limiter or RateLimiter()
         self.session = requests.Session()
 
         if not os.path.exists(self.save_path):
             os.mkdir(self.save_path)
 
-        if not os.path.exists(self.data_path):
-            os.mkdir(self.data_path)
-
+        # Pages are saved one file per page in the data folder ('files'), or in compressed segments ('segments')
+        self.pages = get_page_store(pages, self.save_path)
+        self.state = state or CrawlState(self.save_path, self.pages)
+        # Hits can be extracted at scraping time, to only save the fields used by the DataManager
+        self.extract_hits = extract_hits
+        self.builder = None
+        if extract_hits:
+            from mano.data.manager import DataManager
+            self.builder = DataManager.get_builder()
+        # The saved pages names are pushed on the queue, if any, to be processed while crawling
+        self.pages_queue = pages_queue
+
+    @metrics.timed()
     def get_page(self, url):
-        errors = 0
-        while errors < self.max_tries:
+        tries = 0
+        while tries < self.max_tries:
+            self.rate_limiter.acquire()
             try:
                 response = self.session.get(url, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS_CODES:
+                    raise RetryableResponse(response.status_code, parse_retry_after(response.headers.get('Retry-After')))
                 response.raise_for_status()
                 page = html.fromstring(response.text)
-                time.sleep(0.2)
+                self.rate_limiter.success()
                 return response, page
             except requests.HTTPError as e:
                 logging.warning('Page not found: {}'.format(url))
+                self.rate_limiter.success()
                 return response, None
-            except Exception:
-                errors += 1
-                time.sleep(self.sleep_time)
+            except Exception as e:
+                tries += 1
+                retry_after = getattr(e, 'retry_after', None)
+                self.rate_limiter.failure(retry_after)
+                time.sleep(self.rate_limiter.get_backoff(tries, retry_after))
         raise ValueError('Connection error: {}'.format(url))
 
     def _is_scraping_finished(self, level, name):
         """ Function used to manage fast scraping recovery. Check if a category has been fully scraped """
-        file_path = os.path.join(self.save_path, '{}.txt'.format(level))
-        if not os.path.exists(file_path):
-            return False
-        with open(file_path, 'r') as file:
-            categories = file.readlines()
-            categories = [c.strip() for c in categories]
-        return name in categories
+        return self.state.is_finished(level, name)
 
     def _set_scraping_finished(self, level, name):
         """ Function used to manage fast scraping recovery. Save category once it is fully scraped """
-        file_path = os.path.join(self.save_path, '{}.txt'.format(level))
-        with open(file_path, 'a') as file:
-            file.write(name + '\n')
+        self.state.set_finished(level, name)
 
     def run(self):
         r, page_html = self.get_page(self.url)
@@ -81,6 +96,8 @@ class Scraper:
             if not self._is_scraping_finished('group_categories', group_category):
                 self._scrap_group_category(group_category)
                 self._set_scraping_finished('group_categories', group_category)
+        self.state.flush()
+        logging.info('Crawl stats: {}'.format(self.rate_limiter.get_stats()))
 
     def _scrap_group_category(self, url):
         """ Group categories are the second level categoties on the home page, like 'mobilier de jardin et jeux', 'piscine', .. """
@@ -142,12 +159,21 @@ class Scraper:
         if page > self.max_pages:
             return False
 
-        page_path = os.path.join(self.data_path, '{}-page-{}.json'.format(url[1:], page))
-        if os.path.exists(page_path):
+        if self.state.is_finished('pages', self._get_page_name(url, page)):
             return False
 
-        r, page_html = self.get_page(self.url + url + ('?page={}'.format(page) if page > 1 else ''))
+        r, page_html = self.get_page(self._get_sub_category_url(url, page))
+        return self._save_sub_category_page(url, page, r, page_html)
+
+    def _get_page_name(self, url, page, raw=False):
+        extension = RECORDS_EXTENSION if self.extract_hits and not raw else '.json'
+        return '{}-page-{}{}'.format(url[1:], page, extension)
 
+    def _get_sub_category_url(self, url, page):
+        return self.url + url + ('?page={}'.format(page) if page > 1 else '')
+
+    def _save_sub_category_page(self, url, page, r, page_html):
+        """ Save the products of a sub category page. Return False if there is no more page to scrap """
         # Page not found
         if page_html is None:
             return False
@@ -156,17 +182,39 @@ class Scraper:
             return False
 
         # Deal with category redirecting, which can lead to an infinite loop
-        if url not in r.url:
+        if url not in str(r.url):
             return False
 
         logging.info('      page {}'.format(page))
-        results = str(page_html.xpath('//div[@id=\"fragment-listing\"]/script/text()'))
-        self._save_sub_category(page_path, results)
+        results = page_html.xpath('//div[@id=\"fragment-listing\"]/script/text()')
+        if self.extract_hits:
+            page_name = self._save_sub_category_records(url, page, results)
+        else:
+            page_name = self._save_sub_category(self._get_page_name(url, page), results)
+        self.state.set_finished('pages', self._get_page_name(url, page), flush=False)
+        metrics.count('scraper.pages')
+        # Blocks while the queue is full, so that the crawl waits for the pages processing
+        if self.pages_queue is not None:
+            self.pages_queue.put(page_name)
         return True
 
-    def _save_sub_category(self, page_path, results):
-        with open(page_path, 'w', encoding='utf-8') as file:
-            file.write(results)
+    def _save_sub_category(self, page_name, results):
+        self.pages.write(page_name, [str(r) for r in results])
+        return page_name
+
+    def _save_sub_category_records(self, url, page, results):
+        """ Extract and validate the hits, to only save the fields used by the DataManager. The page is saved as is
+        if its hits cannot be extracted """
+        scripts = [str(r) for r in results]
+        try:
+            records = [self.builder.extract(hit) for hit in iter_hits_from_json_text('\n'.join(scripts))]
+            if any(['objectID' not in record for record in records]):
+                raise ValueError('Hit without objectID')
+        except ValueError as e:
+            logging.error('{} page {}: {}'.format(url, page, e))
+            return self._save_sub_category(self._get_page_name(url, page, raw=True), scripts)
+        self.pages.write_records(self._get_page_name(url, page), records)
+        return self._get_page_name(url, page)
 
     def _has_no_product(self, page_html):
         """ not used. Initially for scraping products from html"""
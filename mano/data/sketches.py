@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+
+
+class FrameSketch:
+    """ Mergeable statistics of the columns of a dataframe, computed chunk by chunk so that the statistics of a whole
+    dataset are obtained by merging the sketches of its chunks, without loading it """
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, data):
+        return cls(len(data), {column: ColumnSketch.from_series(data[column]) for column in data.columns})
+
+    def merge(self, other):
+        columns = dict(self.columns)
+        for column, sketch in other.columns.items():
+            columns[column] = columns[column].merge(sketch) if column in columns else sketch
+        return FrameSketch(self.rows + other.rows, columns)
+
+    def to_frame(self, max_top_values=10):
+        """ Statistics of each column, like DataFrameAnalyzer.analyze """
+        results = [sketch.get_stats(self.rows, max_top_values) for sketch in self.columns.values()]
+        return pd.DataFrame(results, index=list(self.columns))
+
+
+class ColumnSketch:
+    """ Mergeable statistics of a column: rows and nulls counts, min and max, a t-digest of the float values for
+    quantiles, a HyperLogLog of the unique values, and the counts of the most frequent values of the other columns.
+    Counts are exact as long as each chunk has at most max_top_values unique values """
+
+    def __init__(self, dtype, rows, nulls, vmin=np.nan, vmax=np.nan, digest=None, registers=None, top_values=None,
+                 complete=False, max_top_values=100):
+        self.dtype = dtype
+        self.rows = rows
+        self.nulls = nulls
+        self.vmin = vmin
+        self.vmax = vmax
+        self.digest = digest
+        self.registers = registers
+        self.top_values = top_values or {}
+        self.complete = complete
+        self.max_top_values = max_top_values
+
+    @classmethod
+    def from_series(cls, series, max_top_values=100, compression=100):
+        values = series.dropna()
+        sketch = cls(series.dtype, len(series), len(series) - len(values), registers=get_hll_registers(values),
+                     max_top_values=max_top_values)
+        if pd.api.types.is_float_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            if len(values) > 0:
+                sketch.vmin, sketch.vmax = values.min(), values.max()
+            if pd.api.types.is_float_dtype(series):
+                sketch.digest = TDigest.from_values(values.to_numpy(dtype=np.float64), compression)
+        else:
+            counts = values.value_counts()
+            counts = counts[counts > 0]
+            # value_counts is sorted by decreasing counts, like the merged top values
+            sketch.complete = len(counts) <= max_top_values
+            sketch.top_values = counts.head(max_top_values).to_dict()
+        return sketch
+
+    def merge(self, other):
+        top_values = dict(self.top_values)
+        for value, count in other.top_values.items():
+            top_values[value] = top_values.get(value, 0) + count
+        complete = self.complete and other.complete and len(top_values) <= self.max_top_values
+        # Only the most frequent values are kept, their counts being lower bounds once the sketch is not complete
+        top_values = dict(sorted(top_values.items(), key=lambda item: -item[1])[:self.max_top_values])
+
+        digest = self.digest if other.digest is None else other.digest if self.digest is None else \
+            self.digest.merge(other.digest)
+        return ColumnSketch(
+            get_common_dtype(self.dtype, other.dtype), self.rows + other.rows, self.nulls + other.nulls,
+            vmin=merge_bounds(self.vmin, other.vmin, min), vmax=merge_bounds(self.vmax, other.vmax, max),
+            digest=digest, registers=np.maximum(self.registers, other.registers), top_values=top_values,
+            complete=complete, max_top_values=self.max_top_values
+        )
+
+    def get_stats(self, rows, max_top_values=10):
+        if self.complete:
+            uniques = len(self.top_values)
+        else:
+            uniques = int(round(get_hll_estimate(self.registers)))
+        top_values = list(self.top_values.items())[:max_top_values]
+        return {
+            'dtype': self.dtype, 'nulls': self.nulls, 'uniques': uniques, 'min': self.vmin,
+            'median': self.digest.quantile(0.5) if self.digest is not None else np.nan, 'max': self.vmax,
+            'top_values': [(value, count / rows) for value, count in top_values]
+        }
+
+
+class TDigest:
+    """ Quantiles sketch: the values are summarized by at most compression + 1 centroids (mean, weight, min, max),
+    smaller at the tails, following the t-digest k1 scale function. Repeated values are gathered first, so that the
+    quantiles of discrete values are exact """
+
+    def __init__(self, means, weights, mins, maxs, compression=100):
+        self.means = means
+        self.weights = weights
+        self.mins = mins
+        self.maxs = maxs
+        self.compression = compression
+
+    @classmethod
+    def from_values(cls, values, compression=100):
+        return cls(values, np.ones(len(values)), values, values, compression)._compress()
+
+    def merge(self, other):
+        return TDigest(*[np.concatenate([a, b]) for a, b in [(self.means, other.means), (self.weights, other.weights),
+                                                              (self.mins, other.mins), (self.maxs, other.maxs)]],
+                       compression=self.compression)._compress()
+
+    def quantile(self, q):
+        if len(self.means) == 0:
+            return np.nan
+        cumulative = np.cumsum(self.weights)
+        target = q * cumulative[-1]
+        # The quantile of a centroid of a single value is that value
+        i = min(np.searchsorted(cumulative, target), len(cumulative) - 1)
+        if self.mins[i] == self.maxs[i]:
+            return self.mins[i]
+        return np.interp(target, cumulative - self.weights / 2, self.means)
+
+    def _compress(self):
+        if len(self.means) == 0:
+            return self
+        order = np.argsort(self.means, kind='stable')
+        means, weights, mins, maxs = self.means[order], self.weights[order], self.mins[order], self.maxs[order]
+        # Centroids of the same value are gathered, then adjacent centroids within the same unit of the scale
+        # function are merged
+        for merge_starts in [self._get_values_starts, self._get_scale_starts]:
+            starts = merge_starts(means, weights)
+            weights_sum = np.add.reduceat(weights, starts)
+            means = np.add.reduceat(means * weights, starts) / weights_sum
+            mins, maxs = np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts)
+            weights = weights_sum
+        return TDigest(means, weights, mins, maxs, self.compression)
+
+    def _get_values_starts(self, means, weights):
+        return np.flatnonzero(np.r_[True, means[1:] != means[:-1]])
+
+    def _get_scale_starts(self, means, weights):
+        q = (np.cumsum(weights) - weights / 2) / weights.sum()
+        k = np.floor(self.compression * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+        return np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+
+
+HLL_PRECISION = 12
+
+
+def get_hll_registers(values, precision=HLL_PRECISION):
+    """ HyperLogLog registers of the values: the first bits of the hash of a value select a register, keeping the
+    highest rank of the first bit set in the other bits """
+    registers = np.zeros(2 ** precision, dtype=np.uint8)
+    if len(values) == 0:
+        return registers
+    # Numbers are hashed as floats, so that ints and floats chunks of a column agree
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        values = values.astype(np.float64)
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    bits = hashes & np.uint64(2 ** (64 - precision) - 1)
+    with np.errstate(divide='ignore'):
+        bit_length = np.where(bits > 0, np.floor(np.log2(bits.astype(np.float64))) + 1, 0)
+    np.maximum.at(registers, index, (64 - precision - bit_length + 1).astype(np.uint8))
+    return registers
+
+
+def get_hll_estimate(registers):
+    """ Estimate of the number of unique values, with linear counting for small cardinalities """
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(2. ** -registers.astype(np.float64))
+    n_zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and n_zeros > 0:
+        estimate = m * np.log(m / n_zeros)
+    return estimate
+
+
+def merge_bounds(a, b, function):
+    """ Min or max of two bounds, which are missing for columns without values """
+    if pd.isnull(a):
+        return b
+    return a if pd.isnull(b) else function(a, b)
+
+
+def get_common_dtype(a, b):
+    """ Dtype of the concatenation of two columns """
+    if a == b:
+        return a
+    return pd.concat([pd.Series(dtype=a), pd.Series(dtype=b)]).dtype
@@ -0,0 +1,61 @@
+import os
+import threading
+
+
+class CrawlState:
+    """ Crawl state used for fast scraping recovery: the finished categories of each level, and the scraped pages.
+    Each level is loaded once into a set. Updates are appended under a lock to the level file ('{level}.txt'), and
+    flushed and fsynced by batches of batch_size, or immediately if flush is True """
+
+    def __init__(self, path, pages=None, batch_size=100):
+        self.path = path
+        self.pages = pages
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.finished = {}
+        self.pending = {}
+
+    def is_finished(self, level, name):
+        with self.lock:
+            return name in self._get_level(level)
+
+    def set_finished(self, level, name, flush=True):
+        with self.lock:
+            self._get_level(level).add(name)
+            self.pending[level].append(name)
+            if flush or len(self.pending[level]) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _get_level(self, level):
+        if level not in self.finished:
+            file_path = self._get_file_path(level)
+            if os.path.exists(file_path):
+                with open(file_path, 'r') as file:
+                    self.finished[level] = set([line.strip() for line in file])
+                self.pending[level] = []
+            elif level == 'pages' and self.pages is not None:
+                # Pages scraped before the pages were tracked are listed once from the page store
+                self.finished[level] = set(self.pages.keys())
+                self.pending[level] = sorted(self.finished[level])
+                self._flush()
+            else:
+                self.finished[level] = set()
+                self.pending[level] = []
+        return self.finished[level]
+
+    def _flush(self):
+        for level, names in self.pending.items():
+            if len(names) == 0:
+                continue
+            with open(self._get_file_path(level), 'a') as file:
+                file.write(''.join([name + '\n' for name in names]))
+                file.flush()
+                os.fsync(file.fileno())
+            self.pending[level] = []
+
+    def _get_file_path(self, level):
+        return os.path.join(self.path, '{}.txt'.format(level))
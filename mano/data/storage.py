@@ -0,0 +1,201 @@
+import json
+import numpy as np
+import pandas as pd
+from aikit.tools.helper_functions import load_pkl, save_pkl
+
+
+class PickleStorage:
+    """ Store dataframes as pickles. Columns and filters are applied after loading the whole dataframe """
+
+    extension = '.pkl'
+
+    def save(self, data, path):
+        save_pkl(data, path)
+
+    def load(self, path, columns=None, filters=None):
+        return filter_dataframe(load_pkl(path), columns, filters)
+
+
+class ParquetStorage:
+    """ Store dataframes as parquet files (requires pyarrow). Only the requested columns and row groups are read. The
+    index and the dtypes are preserved: the columns that parquet does not round-trip are encoded, and restored from
+    the schema metadata """
+
+    extension = '.parquet'
+
+    # Schema metadata keys of the encoded columns, and of the categories of each categorical column
+    metadata_key = b'mano.encoded_columns'
+    categories_key = 'mano.categories.{}'
+
+    def __init__(self, row_group_size=100000, compression='snappy'):
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+    def save(self, data, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        data, encoded = encode_columns(data)
+        table = pa.Table.from_pandas(data, preserve_index=True)
+        metadata = dict(table.schema.metadata)
+        metadata.update(self._get_encoded_metadata(encoded))
+        pq.write_table(table.replace_schema_metadata(metadata), path, compression=self.compression,
+                       row_group_size=self.row_group_size)
+
+    def load(self, path, columns=None, filters=None):
+        import pyarrow.parquet as pq
+
+        encoded = self._read_encoded_metadata(pq.read_schema(path).metadata or {})
+        # Encoded values can not be compared to the filters values, which are applied once decoded
+        if filters is not None and any(column in encoded for column, _, _ in iter_filters(filters)):
+            read_columns = None if columns is None else \
+                list(columns) + [column for column, _, _ in iter_filters(filters) if column not in columns]
+            data = pq.read_table(path, columns=read_columns, use_pandas_metadata=True).to_pandas()
+            return filter_dataframe(decode_columns(data, encoded), columns, filters)
+
+        data = pq.read_table(path, columns=columns, filters=filters, use_pandas_metadata=True).to_pandas()
+        return decode_columns(data, encoded)
+
+    def _get_encoded_metadata(self, encoded):
+        """ Schema metadata of the encoded columns: their kind as json, and the categories as arrow arrays, which keep
+        their type without depending on the pandas version """
+        import pyarrow as pa
+
+        metadata = {self.metadata_key: json.dumps({column: [kind, ordered]
+                                                   for column, (kind, _, ordered) in encoded.items()})}
+        for column, (kind, categories, _) in encoded.items():
+            if kind == 'category':
+                batch = pa.record_batch([pa.array(categories)], names=['categories'])
+                sink = pa.BufferOutputStream()
+                with pa.ipc.new_stream(sink, batch.schema) as writer:
+                    writer.write_batch(batch)
+                metadata[self.categories_key.format(column)] = sink.getvalue().to_pybytes()
+        return metadata
+
+    def _read_encoded_metadata(self, metadata):
+        import pyarrow as pa
+
+        if self.metadata_key not in metadata:
+            return {}
+        encoded = {}
+        for column, (kind, ordered) in json.loads(metadata[self.metadata_key]).items():
+            categories = None
+            if kind == 'category':
+                reader = pa.ipc.open_stream(metadata[self.categories_key.format(column).encode('utf-8')])
+                categories = pd.Index(reader.read_all().column('categories').to_pandas()).rename(None)
+            encoded[column] = (kind, categories, ordered)
+        return encoded
+
+
+def encode_columns(data):
+    """ Encode the columns that parquet does not round-trip: categoricals are stored as codes when their categories
+    are not strings, like booleans, and object columns as json text when they do not only hold strings, like mixed
+    types or lists. Return the encoded dataframe and the dtypes of the encoded columns. Raise a ValueError for object
+    values that can not be written as json """
+    encoded = {}
+    columns = {}
+    for column in data.columns:
+        values = data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            if pd.api.types.infer_dtype(values.cat.categories, skipna=True) not in ('string', 'empty'):
+                encoded[column] = ('category', values.cat.categories, values.cat.ordered)
+                columns[column] = values.cat.codes
+        elif values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+            encoded[column] = ('json', None, None)
+            columns[column] = values.map(lambda value: encode_json(column, value))
+    return replace_columns(data, columns), encoded
+
+
+def encode_json(column, value):
+    """ Json text of a value, None being kept missing. Tuples are restored as lists """
+    if value is None:
+        return None
+    try:
+        return json.dumps(value, default=get_json_item)
+    except (TypeError, ValueError):
+        raise ValueError('Can not store the value {!r} of the column {} as json'.format(value, column))
+
+
+def get_json_item(value):
+    # Numpy scalars and arrays, like the lists read back by pyarrow
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError('Object of type {} is not json serializable'.format(type(value).__name__))
+
+
+def replace_columns(data, columns):
+    """ Shallow copy of data with some columns replaced """
+    if len(columns) > 0:
+        data = data.copy(deep=False)
+        for column, values in columns.items():
+            data[column] = values
+    return data
+
+
+def decode_columns(data, encoded):
+    """ Restore the columns encoded by encode_columns """
+    columns = {}
+    for column, (kind, categories, ordered) in encoded.items():
+        if column not in data.columns:
+            continue
+        if kind == 'category':
+            columns[column] = pd.Categorical.from_codes(data[column].to_numpy(), categories, ordered=ordered)
+        else:
+            columns[column] = pd.Series([None if value is None else json.loads(value) for value in data[column]],
+                                        index=data.index, dtype=object)
+    return replace_columns(data, columns)
+
+
+STORAGES = {
+    'pickle': PickleStorage,
+    'parquet': ParquetStorage
+}
+
+
+def get_storage(storage):
+    """ Get a storage from its name, or return the storage instance given """
+    if isinstance(storage, str):
+        if storage not in STORAGES:
+            raise ValueError('Unknown storage {}, expecting one of {}'.format(storage, list(STORAGES)))
+        return STORAGES[storage]()
+    return storage
+
+
+FILTER_OPERATORS = {
+    '=': lambda s, v: s == v,
+    '==': lambda s, v: s == v,
+    '!=': lambda s, v: s != v,
+    '<': lambda s, v: s < v,
+    '>': lambda s, v: s > v,
+    '<=': lambda s, v: s <= v,
+    '>=': lambda s, v: s >= v,
+    'in': lambda s, v: s.isin(v),
+    'not in': lambda s, v: ~s.isin(v)
+}
+
+
+def iter_filters(filters):
+    """ Iterate over the (column, op, value) of filters """
+    for item in filters:
+        if isinstance(item, tuple):
+            yield item
+        else:
+            yield from item
+
+
+def filter_dataframe(data, columns=None, filters=None):
+    """ Select rows and columns of a dataframe. filters follow the pyarrow format: a list of (column, op, value)
+    combined with AND, or a list of such lists combined with OR """
+    if filters is not None:
+        if len(filters) > 0 and isinstance(filters[0], tuple):
+            filters = [filters]
+        mask = np.zeros(len(data), dtype=bool)
+        for conjunction in filters:
+            conjunction_mask = np.ones(len(data), dtype=bool)
+            for column, operator, value in conjunction:
+                conjunction_mask &= np.asarray(FILTER_OPERATORS[operator](data[column], value), dtype=bool)
+            mask |= conjunction_mask
+        data = data[mask]
+    if columns is not None:
+        data = data[columns]
+    return data
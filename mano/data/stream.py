@@ -0,0 +1,118 @@
+import os
+import re
+import json
+import mmap
+import codecs
+from mano.data.utils import dirty_json_sanitizer, raw_json_sanitizer, RESULTS_START_PATTERN, RESULTS_END_PATTERN
+
+
+WHITESPACES = re.compile(r'\s*')
+
+
+def iter_hits_from_dirty_json_file(file_path, sanitizer=dirty_json_sanitizer, block_size=2 ** 20):
+    """ Stream the hits of a scraped page file one at a time, without loading the whole file in memory """
+    blocks = read_file_blocks(file_path, RESULTS_START_PATTERN, RESULTS_END_PATTERN, block_size)
+    return iter_hits(sanitizer.sanitize_blocks(blocks))
+
+
+def iter_hits_from_json_text(text, sanitizer=raw_json_sanitizer, block_size=2 ** 20):
+    """ Iterate over the hits of a listing script text one at a time """
+    start = text.find(RESULTS_START_PATTERN)
+    end = text.rfind(RESULTS_END_PATTERN)
+    if start < 0 or end < start:
+        raise ValueError('No results found')
+    blocks = (text[i:min(i + block_size, end)] for i in range(start + len(RESULTS_START_PATTERN), end, block_size))
+    return iter_hits(sanitizer.sanitize_blocks(blocks))
+
+
+def read_file_blocks(file_path, start_pattern, end_pattern, block_size):
+    """ Memory-map a file and decode the text between start_pattern and the last end_pattern by blocks """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise ValueError('Empty file: {}'.format(file_path))
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = data.find(start_pattern.encode('utf-8'))
+            end = data.rfind(end_pattern.encode('utf-8'))
+            if start < 0 or end < start:
+                raise ValueError('No results found in {}'.format(file_path))
+
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            for i in range(start + len(start_pattern), end, block_size):
+                yield decoder.decode(data[i:min(i + block_size, end)])
+            yield decoder.decode(b'', final=True)
+
+
+def iter_hits(blocks):
+    """ Yield the hits of the first raw result, from the json text of the raw results array """
+    reader = JsonBlocksReader(blocks)
+    reader.expect('[')
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        key = reader.decode()
+        reader.expect(':')
+        if key == 'hits':
+            reader.expect('[')
+            if reader.peek() == ']':
+                return
+            while True:
+                yield reader.decode()
+                if reader.expect(',]') == ']':
+                    return
+        reader.decode()
+        if reader.expect(',}') == '}':
+            return
+
+
+class JsonBlocksReader:
+    """ Decode json values one at a time from a text given by blocks. Only the value being decoded is kept in
+    memory """
+
+    def __init__(self, blocks):
+        self.blocks = iter(blocks)
+        self.buffer = ''
+        self.position = 0
+        self.decoder = json.JSONDecoder()
+
+    def peek(self):
+        """ Skip whitespaces and return the next character """
+        while True:
+            self.position = WHITESPACES.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._read():
+                raise ValueError('Unexpected end of json')
+
+    def expect(self, characters):
+        character = self.peek()
+        if character not in characters:
+            raise ValueError('Expecting {} instead of {}: {}'.format(
+                characters, character, self.buffer[self.position:(self.position + 40)]))
+        self.position += 1
+        return character
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # The value may be truncated by the end of the buffer
+                if self._read():
+                    continue
+                raise
+            # A number ending the buffer may continue in the next block
+            if end == len(self.buffer) and self._read():
+                continue
+            self.position = end
+            return value
+
+    def _read(self):
+        block = next(self.blocks, None)
+        if block is None:
+            return False
+        self.buffer = self.buffer[self.position:] + block
+        self.position = 0
+        return True
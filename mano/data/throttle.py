@@ -0,0 +1,135 @@
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RetryableResponse(Exception):
+    """ Raised for responses meaning the server is overloaded, and the request should be retried later """
+
+    def __init__(self, status_code, retry_after=None):
+        Exception.__init__(self, 'Status {}'.format(status_code))
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """ Token bucket limiting the requests per second across all the workers sharing it.
+
+    The rate is adaptive: it is halved on each failure and slowly increased back to max_rate on successes. Retries
+    wait for a jittered exponential backoff, or for the Retry-After delay sent by the server. After
+    failure_threshold consecutive failures, the circuit opens and all requests wait for recovery_time. Then a single
+    request is let through as a probe: its success closes the circuit, and its failure opens it again. The other
+    requests check the circuit every probe_interval until then. clock and rng can be given for tests """
+
+    def __init__(self, max_rate=10., min_rate=0.5, burst=None, backoff_base=1., backoff_max=60.,
+                 failure_threshold=10, recovery_time=60., probe_interval=1., clock=None, rng=None):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate = max_rate
+        self.burst = burst or max_rate
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.probe_interval = probe_interval
+        self.clock = clock or time.monotonic
+        self.rng = rng or random.Random()
+
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = self.clock()
+        self.blocked_until = 0.
+        self.consecutive_failures = 0
+        # The circuit is 'closed', 'open' until circuit_until, or 'half_open' while the probe is sent
+        self.circuit = 'closed'
+        self.circuit_until = 0.
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'waits': 0, 'wait_time': 0., 'circuit_opens': 0}
+
+    def reserve(self):
+        """ Reserve a token for a request. Return the time to wait, and whether the request can be sent after it. If
+        not, the circuit is open and the token must be reserved again after the wait """
+        with self.lock:
+            now = self.clock()
+            if self.circuit == 'open' and now >= self.circuit_until:
+                # This request is the probe
+                self.circuit = 'half_open'
+            elif self.circuit != 'closed':
+                wait = self.circuit_until - now if self.circuit == 'open' else self.probe_interval
+                self.stats['waits'] += 1
+                self.stats['wait_time'] += wait
+                return wait, False
+
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate, self.blocked_until - now, 0.)
+            self.stats['requests'] += 1
+            if wait > 0:
+                self.stats['waits'] += 1
+                self.stats['wait_time'] += wait
+            return wait, True
+
+    def acquire(self):
+        while True:
+            wait, granted = self.reserve()
+            time.sleep(wait)
+            if granted:
+                return
+
+    async def acquire_async(self):
+        while True:
+            wait, granted = self.reserve()
+            await asyncio.sleep(wait)
+            if granted:
+                return
+
+    def success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.circuit = 'closed'
+            self.rate = min(self.max_rate, self.rate + 0.05 * self.max_rate)
+
+    def failure(self, retry_after=None):
+        with self.lock:
+            now = self.clock()
+            self.stats['failures'] += 1
+            self.consecutive_failures += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            # A failed probe opens the circuit again
+            if self.circuit == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                self.circuit = 'open'
+                self.circuit_until = now + self.recovery_time
+                self.consecutive_failures = 0
+                self.stats['circuit_opens'] += 1
+
+    def get_backoff(self, tries, retry_after=None):
+        """ Time to wait before the retry number `tries` of a request """
+        with self.lock:
+            self.stats['retries'] += 1
+            if retry_after is not None:
+                return retry_after
+            return self.rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** tries))
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, rate=self.rate, circuit=self.circuit)
+
+
+def parse_retry_after(value):
+    """ Parse a Retry-After header, given either in seconds or as an http date """
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.)
+    except (TypeError, ValueError):
+        return None
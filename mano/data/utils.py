@@ -5,65 +5,120 @@ import pandas as pd
 import numpy as np
 
 
-def load_data_from_dirty_json_file(s):
-    start_pattern = '{"rawResults":'
-    end_pattern = ',"state":{'
-    start_index = s.find(start_pattern) + len(start_pattern)
-    end_index = s.rfind(end_pattern)
-    s = s[start_index:end_index]
-
+DIRTY_JSON_REPLACEMENTS = [
     # Replace or remove badly espaced quotes
-    s = s.replace('\\\\\\"', '')
-    s = s.replace('\\\\\"', '')
-    s = s.replace('\\\\"', '')
-    s = s.replace('\\\"', '')
-    s = s.replace('\\"', '')
-    s = s.replace("\\'", "'")
+    ('\\\\\\"', ''),
+    ('\\\\\"', ''),
+    ('\\\\"', ''),
+    ('\\\"', ''),
+    ('\\"', ''),
+    ("\\'", "'"),
 
     # Replace non unicode characters
-    s = s.replace('\\x80', '')
-    s = s.replace('\\x81', '')
-    s = s.replace('\\x82', 'é')
-    s = s.replace('\\x83', 'â')
-    s = s.replace('\\x84', '')
-    s = s.replace('\\x85', 'à')
-    s = s.replace('\\x87', 'ç')
-    s = s.replace('\\x88', 'à')
-    s = s.replace('\\x89', '')
-    s = s.replace('\\x8a', 'è')
-    s = s.replace('\\x8b', '_')
-    s = s.replace('\\x8c', '_')
-    s = s.replace('\\x8d', '')
-    s = s.replace('\\x8e', '')
-    s = s.replace('\\x8f', '')
-    s = s.replace('\\x90', '')
-    s = s.replace('\\x91', '')
-    s = s.replace('\\x92', '\'')
-    s = s.replace('\\x93', '') #\"
-    s = s.replace('\\x94', '') #\"
-    s = s.replace('\\x95', '')
-    s = s.replace('\\x96', '')
-    s = s.replace('\\x97', '')
-    s = s.replace('\\x98', '')
-    s = s.replace('\\x99', '')
-    s = s.replace('\\x9c', 'oe')
-    s = s.replace('\\x9d', 'oe')
-    s = s.replace('\\x9e', 'u')
-    s = s.replace('\\x9f', '')
-    s = s.replace('\\xa0', ' ')
-    s = s.replace('\\xad', '')
+    ('\\x80', ''),
+    ('\\x81', ''),
+    ('\\x82', 'é'),
+    ('\\x83', 'â'),
+    ('\\x84', ''),
+    ('\\x85', 'à'),
+    ('\\x87', 'ç'),
+    ('\\x88', 'à'),
+    ('\\x89', ''),
+    ('\\x8a', 'è'),
+    ('\\x8b', '_'),
+    ('\\x8c', '_'),
+    ('\\x8d', ''),
+    ('\\x8e', ''),
+    ('\\x8f', ''),
+    ('\\x90', ''),
+    ('\\x91', ''),
+    ('\\x92', '\''),
+    ('\\x93', ''), #\"
+    ('\\x94', ''), #\"
+    ('\\x95', ''),
+    ('\\x96', ''),
+    ('\\x97', ''),
+    ('\\x98', ''),
+    ('\\x99', ''),
+    ('\\x9c', 'oe'),
+    ('\\x9d', 'oe'),
+    ('\\x9e', 'u'),
+    ('\\x9f', ''),
+    ('\\xa0', ' '),
+    ('\\xad', ''),
 
     # Removing emojis or special characters
-    s = s.replace('\\U001000b6', '\'')
-    s = s.replace('\\U0001fa91', '_')
-    s = s.replace('\\U0010fc00', '_')
-    s = s.replace('\\U0010fc07', '_')
-    s = s.replace('\\U0010fc00', '_')
-    s = s.replace('\\U0010fc01', '_')
-    s = s.replace('\\U0010fc04', '_')
-    s = s.replace('\\U0010fc08', '_')
-    s = s.replace('\\U0010fc09', '_')
-    s = s.replace('\\U0010fc14', '_')
+    ('\\U001000b6', '\''),
+    ('\\U0001fa91', '_'),
+    ('\\U0010fc00', '_'),
+    ('\\U0010fc07', '_'),
+    ('\\U0010fc01', '_'),
+    ('\\U0010fc04', '_'),
+    ('\\U0010fc08', '_'),
+    ('\\U0010fc09', '_'),
+    ('\\U0010fc14', '_')
+]
+
+
+class StringSanitizer:
+    """ Apply a table of (pattern, replacement) in a single pass over a string, with one compiled regex.
+    Longest patterns are tried first, and replaced text is never scanned again """
+
+    def __init__(self, replacements):
+        self.replacements = dict(replacements)
+        patterns = sorted(self.replacements, key=len, reverse=True)
+        self.regex = re.compile('|'.join(re.escape(p) for p in patterns))
+        self.max_length = len(patterns[0])
+
+    def sanitize(self, s):
+        return self.regex.sub(self._replace, s)
+
+    def sanitize_blocks(self, blocks):
+        """ Sanitize a string given as an iterable of blocks, with the same result as sanitizing it at once.
+        The end of each block, where a match could be truncated, is carried over to the next block """
+        pending = ''
+        for block in blocks:
+            s = pending + block
+            # Matches are fully determined only if they start before this bound
+            bound = len(s) - self.max_length + 1
+            parts = []
+            position = 0
+            for match in self.regex.finditer(s):
+                if match.start() >= bound:
+                    break
+                parts.append(s[position:match.start()])
+                parts.append(self.replacements[match.group()])
+                position = match.end()
+            cut = max(position, bound)
+            parts.append(s[position:cut])
+            pending = s[cut:]
+            yield ''.join(parts)
+        yield self.sanitize(pending)
+
+    def _replace(self, match):
+        return self.replacements[match.group()]
+
+
+dirty_json_sanitizer = StringSanitizer(DIRTY_JSON_REPLACEMENTS)
+
+# Same cleaning for the raw json of the listing script: escaped quotes are removed, and the non unicode characters
+# are replaced, from their actual value instead of their escape sequence
+RAW_JSON_REPLACEMENTS = [('\\"', '')] + [
+    (pattern.encode('ascii').decode('unicode_escape'), replacement) for pattern, replacement in DIRTY_JSON_REPLACEMENTS
+    if pattern.startswith(('\\x', '\\U'))
+]
+
+raw_json_sanitizer = StringSanitizer(RAW_JSON_REPLACEMENTS)
+
+
+RESULTS_START_PATTERN = '{"rawResults":'
+RESULTS_END_PATTERN = ',"state":{'
+
+
+def load_data_from_dirty_json_file(s, sanitizer=dirty_json_sanitizer):
+    start_index = s.find(RESULTS_START_PATTERN) + len(RESULTS_START_PATTERN)
+    end_index = s.rfind(RESULTS_END_PATTERN)
+    s = sanitizer.sanitize(s[start_index:end_index])
 
     try:
         return json.loads(s)
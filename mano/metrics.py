@@ -0,0 +1,161 @@
+import os
+import time
+import functools
+import tracemalloc
+import threading
+import pandas as pd
+
+
+class Metrics:
+    """ Timers, memory high-water marks and counters of the pipeline hot paths. Nothing is recorded unless enabled,
+    with the MANO_METRICS environment variable or enable(): disabled timers and counters only check a flag. Metrics
+    are recorded per process, so the chunks processed by the DataManager workers are only measured when n_workers is
+    None. The peak memory of the timers is only measured with trace_memory, or the MANO_METRICS_MEMORY environment
+    variable, as tracemalloc slows down every allocation of the process """
+
+    def __init__(self, enabled=False, trace_memory=False):
+        self.enabled = False
+        self.trace_memory = False
+        self.tracing = False
+        self.lock = threading.Lock()
+        self.running = []
+        self.reset()
+        if enabled:
+            self.enable(trace_memory)
+
+    def enable(self, trace_memory=False):
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        elif not trace_memory:
+            self._stop_tracing()
+        self.trace_memory = trace_memory
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.trace_memory = False
+        self._stop_tracing()
+
+    def _stop_tracing(self):
+        # Tracing started by another tool is left running
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def reset(self):
+        with self.lock:
+            self.timers = {}
+            self.counters = {}
+            self.start_time = time.perf_counter()
+
+    def timer(self, name):
+        """ Context manager timing a block, and recording the peak memory allocated during the block """
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name)
+
+    def timed(self, name=None):
+        """ Decorator timing each call of a function, named like the function by default """
+        def decorator(function):
+            timer_name = name or '{}.{}'.format(function.__module__.split('.')[-1], function.__qualname__)
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Timer(self, timer_name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, n=1):
+        """ Add n to a counter, like the files, hits or rows processed """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def start_memory(self, timer):
+        """ Start measuring the memory of a timer, from the memory currently allocated """
+        timer.traced = self.trace_memory and tracemalloc.is_tracing()
+        if not timer.traced:
+            return
+        with self.lock:
+            self._update_peaks()
+            timer.start_memory = timer.peak_memory = tracemalloc.get_traced_memory()[0]
+            self.running.append(timer)
+
+    def stop_memory(self, timer):
+        """ Stop measuring the memory of a timer, and return the peak memory allocated since its start, None if memory
+        is not traced """
+        if not timer.traced:
+            return None
+        with self.lock:
+            self._update_peaks()
+            self.running.remove(timer)
+        return max(timer.peak_memory - timer.start_memory, 0)
+
+    def _update_peaks(self):
+        # The peak of tracemalloc is shared by the running timers, which may be nested, so it is reported to each of
+        # them before being reset
+        peak = tracemalloc.get_traced_memory()[1]
+        for timer in self.running:
+            timer.peak_memory = max(timer.peak_memory, peak)
+        tracemalloc.reset_peak()
+
+    def record(self, name, seconds, peak_memory):
+        with self.lock:
+            calls, total, longest, memory = self.timers.get(name, (0, 0., 0., None))
+            if peak_memory is not None:
+                memory = peak_memory if memory is None else max(memory, peak_memory)
+            self.timers[name] = (calls + 1, total + seconds, max(longest, seconds), memory)
+
+    def get_report(self):
+        """ Statistics of the timers and counters recorded since the last reset, as a dataframe. Counters are given
+        per second of elapsed time, and the peak memory is missing if not traced """
+        elapsed = time.perf_counter() - self.start_time
+        with self.lock:
+            rows = [{'name': name, 'calls': calls, 'seconds': total, 'mean_seconds': total / calls,
+                     'max_seconds': longest, 'peak_memory_mb': memory / 2 ** 20 if memory is not None else float('nan')}
+                    for name, (calls, total, longest, memory) in self.timers.items()]
+            rows += [{'name': name, 'count': n, 'per_second': n / elapsed if elapsed > 0 else float('nan')}
+                     for name, n in self.counters.items()]
+        columns = ['name', 'calls', 'seconds', 'mean_seconds', 'max_seconds', 'peak_memory_mb', 'count', 'per_second']
+        return pd.DataFrame(rows, columns=columns).set_index('name')
+
+
+class Timer:
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.metrics.start_memory(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        seconds = time.perf_counter() - self.start
+        self.metrics.record(self.name, seconds, self.metrics.stop_memory(self))
+        return False
+
+
+class NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+def is_env_set(name):
+    return os.getenv(name, '') not in ('', '0')
+
+
+metrics = Metrics(is_env_set('MANO_METRICS'), is_env_set('MANO_METRICS_MEMORY'))
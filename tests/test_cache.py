@@ -0,0 +1,56 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import TransformerMixin, BaseEstimator
+from pandas.testing import assert_frame_equal
+from mano.core.cache import ArtifactCache, CachedTransformer
+from mano.core.transformers import CategoryCounter, ColumnsTypeConverter
+
+
+class TargetAverager(TransformerMixin, BaseEstimator):
+    """ Add the average of y, fitted on y only """
+
+    def fit(self, X, y):
+        self.average = float(np.mean(y))
+        return self
+
+    def transform(self, X):
+        X['average'] = self.average
+        return X
+
+    def get_output_columns(self, X):
+        return ['average']
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({'seller_name': ['a', 'b', 'a', 'c'], 'price': [1., 2., 3., 4.]})
+
+
+def test_cached_outputs(data, tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    results = CachedTransformer(CategoryCounter('seller_name'), cache).fit(data, None).transform(data.copy())
+    cached = CachedTransformer(CategoryCounter('seller_name'), cache).fit(data, None).transform(data.copy())
+    assert_frame_equal(cached, results)
+    # The fitted state and the outputs
+    assert len(os.listdir(str(tmp_path))) == 2
+
+
+def test_fit_keyed_by_y(data, tmp_path):
+    """ A transformer refitted on the same X with another y is not given the first fitted state """
+    cache = ArtifactCache(str(tmp_path))
+    first = CachedTransformer(TargetAverager(), cache).fit_transform(data.copy(), np.array([1., 1., 1., 1.]))
+    second = CachedTransformer(TargetAverager(), cache).fit_transform(data.copy(), np.array([2., 2., 2., 2.]))
+    assert list(first['average']) == [1.] * 4
+    assert list(second['average']) == [2.] * 4
+
+
+def test_copy_outputs_not_cached(data, tmp_path):
+    """ Transformers with a copy param are applied, their outputs being cheaper to compute than to load """
+    cache = ArtifactCache(str(tmp_path))
+    results = CachedTransformer(ColumnsTypeConverter('float64', 'float32'), cache).fit(data, None).transform(data)
+    assert results['price'].dtype == np.float32
+    assert data['price'].dtype == np.float64
+    # Only the fitted state
+    assert len(os.listdir(str(tmp_path))) == 1
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_series_equal
+from mano.data.dtypes import DtypeOptimizer
+
+
+def test_optimize_dtypes():
+    data = pd.DataFrame({
+        'rating_count': np.array([1, 2, 300, 4, 5, 6], dtype='int64'),
+        'price': [1.5, 2.5, np.nan, 4., 5., 6.],
+        'on_sale': np.array([True, False, None, True, True, False], dtype=object),
+        'seller_name': ['a', 'b', 'a', 'a', 'b', 'a']
+    })
+    dtypes = DtypeOptimizer().fit(data).get_dtypes()
+    assert dtypes['rating_count'] == np.dtype(np.uint16)
+    assert dtypes['price'] == np.dtype(np.float32)
+    assert dtypes['on_sale'] == 'boolean'
+    assert list(dtypes['seller_name'].categories) == ['a', 'b']
+
+
+def test_unhashable_values_kept():
+    """ Columns of unhashable values, like lists, are kept as is """
+    data = pd.DataFrame({'thumbnails': [['a'], [], None, ['a', 'b'], ['c'], []],
+                         'seller_name': ['a', 'b', 'a', 'a', 'b', 'a']})
+    optimizer = DtypeOptimizer()
+    results = optimizer.fit(data).transform(data)
+    assert optimizer.get_dtypes()['thumbnails'] is None
+    assert_series_equal(results['thumbnails'], data['thumbnails'])
+    assert isinstance(results['seller_name'].dtype, pd.CategoricalDtype)
+
+
+def test_unhashable_values_in_a_chunk():
+    optimizer = DtypeOptimizer()
+    optimizer.fit(pd.DataFrame({'banner': ['a', 'b', 'a']}))
+    optimizer.fit(pd.DataFrame({'banner': [['a'], ['b'], None]}))
+    assert optimizer.get_dtypes()['banner'] is None
+
+
+def test_mixed_values_kept():
+    """ Only strings are converted: the values of mixed columns are kept as is """
+    data = pd.DataFrame({'seller_country_id': pd.Series([1, 'FR', None, 2, 'FR', 'FR'], dtype=object),
+                         'rating_count': pd.Categorical([1, 2, 3, 4, 5, 6])})
+    optimizer = DtypeOptimizer()
+    results = optimizer.fit(data).transform(data)
+    assert optimizer.get_dtypes() == {'seller_country_id': None, 'rating_count': None}
+    assert list(results['seller_country_id']) == [1, 'FR', None, 2, 'FR', 'FR']
+    assert_series_equal(results['rating_count'], data['rating_count'])
+
+
+def test_integral_floats():
+    """ Integral floats are converted to the smallest lossless dtype, ints or float32 """
+    data = pd.DataFrame({'small': [1., 2., 3.], 'large': [1e10, 2., 3.], 'missing': [1e10, 2., np.nan],
+                         'ints': np.array([10 ** 10, 2, 3], dtype='int64')})
+    dtypes = DtypeOptimizer().fit(data).get_dtypes()
+    assert dtypes['small'] == np.dtype(np.uint8)
+    assert dtypes['large'] == np.dtype(np.float32)
+    assert dtypes['missing'] == np.dtype(np.float32)
+    assert dtypes['ints'] == np.dtype(np.uint64)
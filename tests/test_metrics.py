@@ -0,0 +1,44 @@
+import tracemalloc
+import numpy as np
+from mano.metrics import Metrics
+
+
+def test_peak_memory_per_timer():
+    """ Each timer reports the memory allocated during its block, not the peak of the process """
+    metrics = Metrics(enabled=True, trace_memory=True)
+    try:
+        with metrics.timer('large'):
+            np.ones(50 * 2 ** 20, dtype=np.uint8)
+        with metrics.timer('small'):
+            np.ones(2 ** 20, dtype=np.uint8)
+        with metrics.timer('outer'):
+            with metrics.timer('inner'):
+                np.ones(10 * 2 ** 20, dtype=np.uint8)
+            data = np.ones(5 * 2 ** 20, dtype=np.uint8)
+        report = metrics.get_report()['peak_memory_mb']
+    finally:
+        metrics.disable()
+
+    assert 50 <= report['large'] < 51
+    assert 1 <= report['small'] < 2
+    assert 10 <= report['inner'] < 11
+    assert 10 <= report['outer'] < 11
+    assert len(data) == 5 * 2 ** 20
+
+
+def test_disabled():
+    metrics = Metrics()
+    with metrics.timer('block'):
+        metrics.count('items')
+    assert len(metrics.get_report()) == 0
+
+
+def test_memory_not_traced():
+    """ Memory is only traced on demand, tracemalloc slowing down all the allocations """
+    metrics = Metrics(enabled=True)
+    assert not tracemalloc.is_tracing()
+    with metrics.timer('block'):
+        np.ones(2 ** 20, dtype=np.uint8)
+    report = metrics.get_report()
+    assert report.loc['block', 'calls'] == 1
+    assert np.isnan(report.loc['block', 'peak_memory_mb'])
@@ -0,0 +1,50 @@
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from mano.core.model import LightGbmWrapper, DatasetCache, get_fingerprint
+
+PARAMS = {'objective': 'regression', 'verbose': -1, 'num_threads': 1}
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    X = pd.DataFrame({'price': rng.uniform(0, 100, 200), 'rating': rng.randint(0, 5, 200).astype(float)})
+    y = X['price'] * 2 + rng.normal(0, 1, 200)
+    return X, y
+
+
+def test_fingerprint_aliases(data):
+    X, y = data
+    fingerprint = get_fingerprint(X, y, 'auto', PARAMS)
+    assert get_fingerprint(X, y, 'auto', dict(PARAMS, learning_rate=0.01)) == fingerprint
+    assert get_fingerprint(X, y, 'auto', dict(PARAMS, min_data=50)) != fingerprint
+    assert get_fingerprint(X, y, 'auto', dict(PARAMS, min_data=50)) == \
+        get_fingerprint(X, y, 'auto', dict(PARAMS, min_data_in_leaf=50))
+
+
+def test_dataset_cache(data):
+    """ The binned dataset is reused by the wrappers sharing a cache, unless built with other params """
+    X, y = data
+    cache = DatasetCache()
+    first = LightGbmWrapper(PARAMS, cv=2, verbose=0, dataset_cache=cache)
+    first.fit(X, y)
+    dataset, _ = first._get_dataset(X, y)
+    assert LightGbmWrapper(dict(PARAMS, learning_rate=0.2), dataset_cache=cache)._get_dataset(X, y)[0] is dataset
+    assert LightGbmWrapper(dict(PARAMS, min_data=50), dataset_cache=cache)._get_dataset(X, y)[0] is not dataset
+    assert LightGbmWrapper(PARAMS)._get_dataset(X, y)[0] is not dataset
+
+    loaded = pickle.loads(pickle.dumps(first))
+    assert len(loaded.dataset_cache.datasets) == 0
+    np.testing.assert_array_equal(loaded.predict(X), first.predict(X))
+
+
+@pytest.mark.parametrize('to_array', [False, True])
+def test_predict_batches(data, to_array):
+    X, y = data
+    model = LightGbmWrapper(PARAMS, cv=2, verbose=0).fit(X, y)
+    expected = model.predict(X)
+    X = X.to_numpy() if to_array else X
+    np.testing.assert_allclose(model.predict(X, batch_size=30), expected)
+    np.testing.assert_allclose(model.predict(X, batch_size=30, n_jobs=2), expected)
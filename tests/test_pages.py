@@ -0,0 +1,27 @@
+import threading
+from mano.data.pages import SegmentPageStore
+
+
+def test_segment_store_concurrent_reload(tmp_path):
+    """ The index reloaded while pages are written never loses pages already seen """
+    path = str(tmp_path)
+    writer = SegmentPageStore(path, segment_size=512)
+    reader = SegmentPageStore(path)
+    names = ['page-{}'.format(i) for i in range(200)]
+
+    def write():
+        for name in names:
+            writer.write(name, ['script of ' + name])
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    seen = set()
+    while thread.is_alive():
+        keys = set(reader.keys())
+        assert seen <= keys
+        seen = keys
+        for name in keys:
+            assert reader.read(name) == 'script of ' + name
+    thread.join()
+    assert sorted(reader.keys()) == sorted(names)
+    assert [reader.read(name) for name in names] == ['script of ' + name for name in names]
@@ -0,0 +1,111 @@
+import os
+import json
+import asyncio
+import threading
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from mano.data.scraper import Scraper
+from mano.data.async_scraper import AsyncScraper
+from mano.data.throttle import RateLimiter
+
+GROUP_CATEGORIES = {'/jardin': ['/mobilier', '/piscine'], '/maison': ['/cuisine']}
+CATEGORIES = {'/mobilier': ['/tables', '/chaises'], '/piscine': ['/pompes', '/chaises'], '/cuisine': ['/fours']}
+SUB_CATEGORIES_PAGES = {'/tables': 3, '/chaises': 1, '/pompes': 0, '/fours': 5}
+
+
+def get_listing_script(url, page):
+    raw = {'rawResults': [{'hits': [{'objectID': '{}-{}'.format(url[1:], page)}], 'page': page}], 'state': {}}
+    return 'window.__STATE__ = ' + json.dumps(raw, separators=(',', ':')) + ';'
+
+
+async def handle(request):
+    path = request.path
+    if path == '/':
+        links = ''.join(['<li><a href="{}">g</a></li>'.format(url) for url in GROUP_CATEGORIES])
+        body = '<div><ul><li><ul>{}</ul></li></ul></div>'.format(links)
+    elif path in GROUP_CATEGORIES:
+        body = ''.join(['<a data-qa="categoryLinkCta" href="{}">c</a>'.format(url) for url in GROUP_CATEGORIES[path]])
+    elif path in CATEGORIES:
+        body = ''.join(['<a data-qa="filterLinkCta" href="{}">s</a>'.format(url) for url in CATEGORIES[path]])
+    elif path in SUB_CATEGORIES_PAGES:
+        page = int(request.query.get('page', 1))
+        if page > SUB_CATEGORIES_PAGES[path]:
+            body = '<div class="products-no-results"></div>'
+        else:
+            body = '<div id="fragment-listing"><script>{}</script></div>'.format(get_listing_script(path, page))
+    else:
+        raise web.HTTPNotFound()
+    return web.Response(text='<html><body>{}</body></html>'.format(body), content_type='text/html')
+
+
+@pytest.fixture(scope='module')
+def url():
+    """ Local server of canned pages, run on an event loop of its own so that the threaded scraper can use it """
+    app = web.Application()
+    app.router.add_get('/{path:.*}', handle)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = TestServer(app)
+    asyncio.run_coroutine_threadsafe(server.start_server(), loop).result()
+    yield str(server.make_url('')).rstrip('/')
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+def read_tree(path):
+    """ Content of the files of a directory, with the lines of the recovery files sorted """
+    files = {}
+    for directory, _, names in os.walk(path):
+        for name in names:
+            file = os.path.join(directory, name)
+            with open(file, 'r', encoding='utf-8') as f:
+                content = f.read()
+            files[os.path.relpath(file, path)] = sorted(content.splitlines()) if name.endswith('.txt') else content
+    return files
+
+
+@pytest.fixture(scope='module')
+def expected(url, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('scraper') / 'data')
+    Scraper(url, path, rate_limiter=RateLimiter(max_rate=1000.)).run()
+    return read_tree(path)
+
+
+def test_scraper_pages(expected):
+    pages = [name for name in expected if name.endswith('.json')]
+    assert len(pages) == sum(SUB_CATEGORIES_PAGES.values())
+    assert sorted(expected['sub_categories.txt']) == sorted(SUB_CATEGORIES_PAGES)
+    assert len(expected['pages.txt']) == len(pages)
+
+
+def test_threaded_scraper(url, expected, tmp_path):
+    path = str(tmp_path / 'data')
+    Scraper(url, path, n_threads=3, rate_limiter=RateLimiter(max_rate=1000.)).run()
+    assert read_tree(path) == expected
+
+
+@pytest.mark.parametrize('page_window', [1, 4])
+def test_async_scraper(url, expected, tmp_path, page_window):
+    path = str(tmp_path / 'data')
+    AsyncScraper(url, path, concurrency=4, page_window=page_window, rate_limiter=RateLimiter(max_rate=1000.)).run()
+    assert read_tree(path) == expected
+
+
+def test_async_scraper_recovery(url, expected, tmp_path):
+    """ A crawl resumed from the recovery files does not fetch the pages already scraped """
+    path = str(tmp_path / 'data')
+    Scraper(url, path, rate_limiter=RateLimiter(max_rate=1000.)).run()
+    with open(os.path.join(path, 'sub_categories.txt'), 'w') as file:
+        file.write('/tables\n')
+    for name in ['group_categories.txt', 'categories.txt']:
+        os.remove(os.path.join(path, name))
+
+    rate_limiter = RateLimiter(max_rate=1000.)
+    AsyncScraper(url, path, rate_limiter=rate_limiter).run()
+    assert read_tree(path) == expected
+    # The home page, the group categories, the categories, and the first page of the sub category without products,
+    # which is not recorded as scraped
+    assert rate_limiter.get_stats()['requests'] == 1 + len(GROUP_CATEGORIES) + len(CATEGORIES) + 1
@@ -0,0 +1,79 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+from mano.data.storage import ParquetStorage, PickleStorage
+
+
+@pytest.fixture
+def data():
+    data = pd.DataFrame({
+        'price': [1.5, 2., np.nan, 4., 5.],
+        'seller_name': pd.Categorical(['a', 'b', None, 'a', 'c']),
+        'has_free_delivery': pd.Categorical([True, None, False, True, None]),
+        'rating_count': pd.Categorical([1, 2, None, 2, 3], ordered=True),
+        'seller_country': pd.Series([1, 'FR', None, 2, 'FR'], dtype=object),
+        'thumbnails': pd.Series([['a'], [], None, ['a', 'b'], ['c']], dtype=object),
+        'title': pd.Series(['x', None, 'y', 'z', 'x'], dtype=object)
+    })
+    data.index = [10, 3, 7, 1, 20]
+    return data
+
+
+def round_trip(storage, data, path, **kwargs):
+    file = str(path / ('data' + storage.extension))
+    storage.save(data, file)
+    return storage.load(file, **kwargs)
+
+
+def test_parquet_round_trip(data, tmp_path):
+    loaded = round_trip(ParquetStorage(row_group_size=2), data, tmp_path)
+    assert_frame_equal(loaded, data)
+    assert list(loaded['seller_country']) == [1, 'FR', None, 2, 'FR']
+
+
+def test_parquet_round_trip_cache(data, tmp_path):
+    """ Loaded data saved again, like the cache, is unchanged """
+    storage = ParquetStorage()
+    loaded = round_trip(storage, round_trip(storage, data, tmp_path), tmp_path)
+    assert_frame_equal(loaded, data)
+
+
+@pytest.mark.parametrize('filters', [
+    [('price', '>', 1.5)],
+    [('has_free_delivery', '==', True)],
+    [[('seller_country', '==', 'FR')], [('seller_name', 'in', ['c'])]]
+])
+def test_parquet_load_like_pickle(data, tmp_path, filters):
+    """ Columns and filters select the same rows, with the same index, as the pickle storage """
+    columns = ['title', 'has_free_delivery']
+    parquet = round_trip(ParquetStorage(row_group_size=2), data, tmp_path, columns=columns, filters=filters)
+    pickle = round_trip(PickleStorage(), data, tmp_path, columns=columns, filters=filters)
+    assert_frame_equal(parquet, pickle)
+
+
+def test_parquet_metadata_without_pickle(data, tmp_path):
+    """ The encoded columns are described by json and arrow arrays, readable without unpickling """
+    import pyarrow.parquet as pq
+
+    file = str(tmp_path / 'data.parquet')
+    ParquetStorage().save(data, file)
+    metadata = pq.read_schema(file).metadata
+    assert json.loads(metadata[ParquetStorage.metadata_key]) == {
+        'has_free_delivery': ['category', False],
+        'rating_count': ['category', True],
+        'seller_country': ['json', None],
+        'thumbnails': ['json', None]
+    }
+
+
+def test_parquet_datetime_categories(tmp_path):
+    data = pd.DataFrame({'date': pd.Categorical(pd.to_datetime(['2020-01-01', None, '2021-06-01']))})
+    assert_frame_equal(round_trip(ParquetStorage(), data, tmp_path), data)
+
+
+def test_parquet_rejects_objects(tmp_path):
+    data = pd.DataFrame({'seller': pd.Series(['a', object()], dtype=object)})
+    with pytest.raises(ValueError, match='seller'):
+        round_trip(ParquetStorage(), data, tmp_path)
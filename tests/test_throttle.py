@@ -0,0 +1,102 @@
+import random
+import pytest
+from mano.data.throttle import RateLimiter, parse_retry_after
+
+
+class Clock:
+    """ Clock moved forward by the tests """
+
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def get_rate_limiter(clock, **kwargs):
+    return RateLimiter(clock=clock, rng=random.Random(0), **kwargs)
+
+
+def test_token_bucket(clock):
+    rate_limiter = get_rate_limiter(clock, max_rate=2., burst=2)
+    assert [rate_limiter.reserve() for _ in range(4)] == [(0., True), (0., True), (0.5, True), (1., True)]
+    clock.now += 2.
+    assert rate_limiter.reserve() == (0., True)
+
+
+def test_jittered_backoff(clock):
+    rate_limiter = get_rate_limiter(clock, backoff_base=1., backoff_max=5.)
+    rng = random.Random(0)
+    expected = [rng.uniform(0, bound) for bound in [2., 4., 5., 5.]]
+    assert [rate_limiter.get_backoff(tries) for tries in [1, 2, 3, 10]] == expected
+    assert rate_limiter.get_stats()['retries'] == 4
+
+
+def test_retry_after(clock):
+    rate_limiter = get_rate_limiter(clock, max_rate=100.)
+    assert rate_limiter.get_backoff(1, retry_after=7.) == 7.
+    rate_limiter.failure(retry_after=7.)
+    # All the requests wait for the delay asked by the server
+    assert rate_limiter.reserve() == (7., True)
+    clock.now += 7.
+    assert rate_limiter.reserve() == (0., True)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('12') == 12.
+    assert parse_retry_after('-1') == 0.
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.
+    assert parse_retry_after('soon') is None
+
+
+def test_adaptive_rate(clock):
+    rate_limiter = get_rate_limiter(clock, max_rate=8., min_rate=1.)
+    for rate in [4., 2., 1., 1.]:
+        rate_limiter.failure()
+        assert rate_limiter.rate == rate
+    for rate in [1.4, 1.8]:
+        rate_limiter.success()
+        assert rate_limiter.rate == pytest.approx(rate)
+    for _ in range(100):
+        rate_limiter.success()
+    assert rate_limiter.rate == 8.
+
+
+def test_circuit_opens(clock):
+    rate_limiter = get_rate_limiter(clock, max_rate=100., failure_threshold=3, recovery_time=30.)
+    for _ in range(2):
+        rate_limiter.failure()
+    rate_limiter.success()
+    for _ in range(3):
+        rate_limiter.failure()
+    assert rate_limiter.get_stats()['circuit_opens'] == 1
+    assert rate_limiter.reserve() == (30., False)
+    clock.now += 10.
+    assert rate_limiter.reserve() == (20., False)
+
+
+def test_circuit_single_probe(clock):
+    """ Once recovered, a single request is let through, the others waiting for its result """
+    rate_limiter = get_rate_limiter(clock, max_rate=100., failure_threshold=1, recovery_time=30., probe_interval=2.)
+    rate_limiter.failure()
+    clock.now += 30.
+    assert rate_limiter.reserve() == (0., True)
+    assert [rate_limiter.reserve() for _ in range(3)] == [(2., False)] * 3
+
+    # A failed probe opens the circuit again
+    rate_limiter.failure()
+    assert rate_limiter.get_stats()['circuit_opens'] == 2
+    assert rate_limiter.reserve() == (30., False)
+
+    # A successful probe closes it
+    clock.now += 30.
+    assert rate_limiter.reserve()[1]
+    rate_limiter.success()
+    assert rate_limiter.get_stats()['circuit'] == 'closed'
+    assert all([granted for _, granted in [rate_limiter.reserve() for _ in range(3)]])
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+from mano.core.transformers import ColumnsTypeConverter, ColumnsRenamer
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        'price (€)': np.arange(5, dtype='float64'),
+        'rating count': np.arange(5, dtype='int64'),
+        'seller name': ['a', 'b', 'c', 'd', 'e']
+    })
+
+
+@pytest.mark.parametrize('copy', [True, False])
+def test_columns_type_converter(data, copy):
+    original = data.copy()
+    results = ColumnsTypeConverter('float64', 'float32', copy=copy).fit(data, None).transform(data)
+
+    assert_frame_equal(data, original)
+    assert results['price (€)'].dtype == 'float32'
+    for column in ['rating count', 'seller name']:
+        assert np.shares_memory(results[column].to_numpy(), data[column].to_numpy()) == (not copy)
+
+
+@pytest.mark.parametrize('copy', [True, False])
+def test_columns_renamer(data, copy):
+    original = data.copy()
+    results = ColumnsRenamer(copy=copy).fit(data, None).transform(data)
+
+    assert_frame_equal(data, original)
+    assert list(results.columns) == ['price__EUR_', 'rating_count', 'seller_name']
+    for column, result_column in zip(data.columns, results.columns):
+        assert np.shares_memory(results[result_column].to_numpy(), data[column].to_numpy()) == (not copy)
+
+
+def test_columns_renamer_not_fitted(data):
+    results = ColumnsRenamer().transform(data)
+    assert list(results.columns) == ['price__EUR_', 'rating_count', 'seller_name']
@@ -0,0 +1,100 @@
+import random
+import itertools
+import pytest
+from mano.data.utils import DIRTY_JSON_REPLACEMENTS, dirty_json_sanitizer
+
+# Characters which are not part of any pattern
+SEPARATORS = ['a', 'z', 'é', ' ', '{', ':', ',', '}']
+
+# Pieces of patterns, which a removal can glue together
+FRAGMENTS = ['\\', '\\\\', '"', "'", 'x8', '0', 'a', 'U0010fc', '00']
+
+# Shortest inputs on which the single pass differs from the cascade, with the outputs of both, among the strings of
+# up to 5 fragments. Replaced text is not scanned again, so a removal gluing the text around it into a pattern keeps
+# that pattern, which a later str.replace of the cascade replaced
+DIVERGENCES = [
+    ('\\\\\\\\""', '', '\\"'),
+    ('\\\\\\\\"\'', "'", "\\'"),
+    ('\\x8\\"0', '', '\\x80'),
+    ('\\x8\\"a', 'è', '\\x8a'),
+    ('\\\\\\\\"\\"', '', '\\'),
+    ('\\x8\\\\"0', '', '\\x80'),
+    ('\\x8\\\\"a', 'è', '\\x8a'),
+    ('\\\\\\\\"x80', '', '\\x80'),
+    ('\\\\\\\\"x8a', 'è', '\\x8a'),
+    ('\\\\x80x8a', 'è', '\\x8a'),
+    ('\\U0010fc\\"00', '_', '\\U0010fc00'),
+    ('\\U0010fc\\\\"00', '_', '\\U0010fc00'),
+    ('\\\\\\\\"U0010fc00', '_', '\\U0010fc00'),
+    ('\\\\x80U0010fc00', '_', '\\U0010fc00')
+]
+
+
+def replace_cascade(s):
+    """ Former sanitizing of the dirty json, with one str.replace per pattern of the table, in order """
+    for pattern, replacement in DIRTY_JSON_REPLACEMENTS:
+        s = s.replace(pattern, replacement)
+    return s
+
+
+def generate_strings(n, separator_probability=1., seed=0):
+    """ Strings of patterns of the table and fragments of patterns, each followed by text with
+    separator_probability, or glued to the next one """
+    rng = random.Random(seed)
+    patterns = [pattern for pattern, _ in DIRTY_JSON_REPLACEMENTS] + FRAGMENTS
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.randint(1, 10)):
+            parts.append(rng.choice(patterns))
+            if rng.random() < separator_probability:
+                parts.append(''.join(rng.choice(SEPARATORS) for _ in range(rng.randint(1, 3))))
+        yield ''.join(parts)
+
+
+def is_divergence(s):
+    return any(divergence in s for divergence, _, _ in DIVERGENCES)
+
+
+def test_sanitize_like_replace_cascade():
+    for s in generate_strings(20000):
+        assert dirty_json_sanitizer.sanitize(s) == replace_cascade(s), s
+
+
+def test_sanitize_adjacent_patterns():
+    """ All the sequences of up to 3 patterns of the table, without text between them """
+    patterns = [pattern for pattern, _ in DIRTY_JSON_REPLACEMENTS]
+    for n in range(1, 4):
+        for parts in itertools.product(patterns, repeat=n):
+            s = ''.join(parts)
+            assert dirty_json_sanitizer.sanitize(s) == replace_cascade(s), s
+
+
+def test_sanitize_glued_fragments():
+    """ All the strings of up to 5 fragments only differ from the cascade on the listed divergences """
+    for n in range(1, 6):
+        for parts in itertools.product(FRAGMENTS, repeat=n):
+            s = ''.join(parts)
+            assert dirty_json_sanitizer.sanitize(s) == replace_cascade(s) or is_divergence(s), s
+
+
+def test_sanitize_glued_strings():
+    for s in generate_strings(20000, separator_probability=0.3):
+        assert dirty_json_sanitizer.sanitize(s) == replace_cascade(s) or is_divergence(s), s
+
+
+@pytest.mark.parametrize('s, cascade, sanitized', DIVERGENCES)
+def test_sanitize_divergences(s, cascade, sanitized):
+    assert replace_cascade(s) == cascade
+    assert dirty_json_sanitizer.sanitize(s) == sanitized
+    # The shortest inputs: the single pass gives the output of the cascade on any part of them
+    for start, stop in itertools.combinations(range(len(s) + 1), 2):
+        if stop - start < len(s):
+            assert dirty_json_sanitizer.sanitize(s[start:stop]) == replace_cascade(s[start:stop])
+
+
+def test_sanitize_blocks():
+    rng = random.Random(0)
+    for s in generate_strings(2000, separator_probability=0.3):
+        cuts = sorted(rng.randint(0, len(s)) for _ in range(rng.randint(0, 5)))
+        blocks = [s[i:j] for i, j in zip([0] + cuts, cuts + [len(s)])]
+        assert ''.join(dirty_json_sanitizer.sanitize_blocks(blocks)) == dirty_json_sanitizer.sanitize(s)